@@ -0,0 +1,59 @@
+"""
+    Time to evaluate a parsed command line with StreamingASTVisitor
+    against running the plan built for it by compiler.Compiler, on small
+    inputs where the overhead of evaluation dominates.
+
+    usage: PYTHONPATH=src python benchmark/compile_benchmark.py [--repeat N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from collections import deque
+
+from compiler import Compiler
+from parsercombinator import command
+from visitor import StreamingASTVisitor
+
+COMMANDS = [
+    "echo hello",
+    "echo a b c d e f g h",
+    "cat {f} | grep a | cut -b 1-2",
+    "echo 'single' \"double\" `echo sub`",
+    "echo a; echo b; echo c; echo d",
+    "cat < {f} > {o}",
+]
+
+
+def run(evaluate, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        deque(evaluate()["stdout"], maxlen=0)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    options = parser.parse_args()
+
+    visitor = StreamingASTVisitor()
+    compiler = Compiler(visitor)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.txt")
+        with open(path, "w") as f:
+            f.write("abc\nbcd\ncab\n")
+        for cmdline in COMMANDS:
+            cmdline = cmdline.format(f=path, o=os.path.join(tmp, "output.txt"))
+            ast = command.parse(cmdline)
+            plan = compiler.compile(ast)
+            print(cmdline.replace(tmp, "TMP"))
+            elapsed = run(lambda: ast.accept(visitor), options.repeat)
+            print(f"    {'visitor':<10}{elapsed * 1e6:10.1f}us")
+            elapsed = run(plan, options.repeat)
+            print(f"    {'plan':<10}{elapsed * 1e6:10.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+    Throughput of cut -b with the interval plan of Cut.cut_helper against
+    the previous implementation, which parsed the byte list again for
+    every line and tested every byte against every range.
+
+    usage: PYTHONPATH=src python benchmark/cut_benchmark.py [--lines N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from apps import Cut
+from filesource import FileSource
+from linebatch import LineBatch
+
+SPECS = ["1", "1-3,5", "2-4,8-", "-3,6,10-12"]
+
+
+def previous_cut_helper(lines, pattern_list):
+    result = []
+    for line in lines:
+        if line[-1:] == b"\n":
+            line = line[:-1]
+        start_list = []
+        end_list = []
+        byte_list = []
+        cut_line = bytearray()
+        for p in pattern_list:
+            if "-" in p:
+                start_i, end_i = p.split("-")
+                start_i = 1 if start_i == "" else int(start_i)
+                end_i = len(line) if end_i == "" else int(end_i)
+                start_list.append(int(start_i) - 1)
+                end_list.append(int(end_i) - 1)
+            else:
+                byte_list.append(int(p) - 1)
+        for i in range(len(line)):
+            if i in byte_list:
+                cut_line.append(line[i])
+            else:
+                for j in range(len(start_list)):
+                    if start_list[j] <= i <= end_list[j]:
+                        cut_line.append(line[i])
+                        break
+        cut_line.append(10)
+        result.append(cut_line)
+    return result
+
+
+def run(path, cut):
+    start = time.perf_counter()
+    with FileSource(path) as source:
+        for batch in source.batches():
+            LineBatch.from_lines(cut(batch))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=10000000)
+    parser.add_argument(
+        "--skip-previous",
+        action="store_true",
+        help="only time the interval plan, the previous version is slow",
+    )
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.txt")
+        with open(path, "w") as f:
+            for i in range(options.lines):
+                f.write(f"line {i} of the benchmark input\n")
+
+        for spec in SPECS:
+            plan = Cut.parse_plan(spec)
+            print(f"cut -b {spec}")
+            elapsed = run(path, lambda lines: Cut.cut_helper(lines.split(), plan))
+            print(f"    {'interval plan':<22}{elapsed:8.3f}s")
+            if not options.skip_previous:
+                pattern_list = spec.split(",")
+                elapsed = run(path, lambda lines: previous_cut_helper(lines, pattern_list))
+                print(f"    {'previous':<22}{elapsed:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
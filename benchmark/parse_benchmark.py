@@ -0,0 +1,51 @@
+"""
+    Throughput of the parsy grammar of parsercombinator against the
+    hand-written descentparser, on typical command lines and on inputs
+    that are slow for parser combinators.
+
+    usage: PYTHONPATH=src python benchmark/parse_benchmark.py [--repeat N]
+"""
+
+import argparse
+import time
+
+import descentparser
+from parsercombinator import command
+
+INPUTS = [
+    ("pipeline", "cat `find . -name '*.py'` | grep \"import\" | sort -r > out.txt"),
+    ("long double quote", 'echo "' + "x" * 20000 + '"'),
+    ("many arguments", "echo " + " ".join(f"arg{i}" for i in range(5000))),
+    ("adjacent quotes", "echo " + "a'b'\"c\"`d`" * 2000),
+    ("long pipeline", " | ".join(["cat a.txt"] + ["grep x"] * 1000)),
+    ("many substitutions", 'echo "' + "`echo a` " * 2000 + '"'),
+]
+
+PARSERS = [
+    ("parsy", command.parse),
+    ("descent", descentparser.parse),
+]
+
+
+def run(parse, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    for name, text in INPUTS:
+        print(f"{name} ({len(text)} characters)")
+        for parser_name, parse in PARSERS:
+            elapsed = run(parse, text, options.repeat)
+            rate = len(text) / elapsed / 1e6
+            print(f"    {parser_name:<10}{elapsed * 1000:10.2f}ms{rate:10.2f}MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+    Wall time of pipelines evaluated by the sequential visit_pipe of
+    StreamingASTVisitor against ConcurrentASTVisitor, which runs every
+    pipeline stage in its own thread.
+
+    usage: PYTHONPATH=src python benchmark/pipe_benchmark.py [--lines N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from collections import deque
+
+from parsercombinator import command
+from visitor import ConcurrentASTVisitor, StreamingASTVisitor
+
+PIPELINES = [
+    "cat {f} | grep '.*7' | grep 'line'",
+    "cat {f} | rev | grep '.*7'",
+    "cat {f} | rev | grep '.*7' | rev | grep 'line'",
+]
+
+VISITORS = [
+    ("sequential", StreamingASTVisitor),
+    ("concurrent", ConcurrentASTVisitor),
+]
+
+
+def run(cmdline, visitor_cls):
+    start = time.perf_counter()
+    out = command.parse(cmdline).accept(visitor_cls())
+    deque(out["stdout"], maxlen=0)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.txt")
+        with open(path, "w") as f:
+            for i in range(options.lines):
+                f.write(f"line {i} of the benchmark input\n")
+
+        for pipeline in PIPELINES:
+            cmdline = pipeline.format(f=path)
+            print(pipeline.format(f="input.txt"))
+            for name, visitor_cls in VISITORS:
+                best = min(run(cmdline, visitor_cls) for _ in range(options.repeat))
+                print(f"    {name:<22}{best:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
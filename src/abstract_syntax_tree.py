@@ -1,36 +1,53 @@
 from abc import ABC, abstractmethod
 from collections.abc import Iterable
+import os
+
+# COMP0010_DEBUG=1 checks the fields of every node as it is built
+DEBUG = bool(os.environ.get("COMP0010_DEBUG"))
 
 
 class AST(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor):
         """Abstract accept method"""
 
 
 class SingleQuote(AST):
+    __slots__ = ("quotedPart",)
+
     def __init__(self, quotedPart):
-        assert type(quotedPart) == str
         self.quotedPart = quotedPart
+        if DEBUG:
+            assert type(quotedPart) == str
 
     def accept(self, visitor):
         return visitor.visit_single_quote(self)
 
 
 class DoubleQuote(AST):
+    __slots__ = ("quotedPart", "containSubstitution")
+
+    # quotedPart is a list of Substitutions and of the runs of characters
+    # between them
     def __init__(self, quotedPart, containSubstitution):
         self.containSubstitution = containSubstitution
         self.quotedPart = quotedPart
-        assert isinstance(self.quotedPart, Iterable)
+        if DEBUG:
+            assert isinstance(self.quotedPart, Iterable)
 
     def accept(self, visitor):
         return visitor.visit_double_quote(self)
 
 
 class Substitution(AST):
+    __slots__ = ("quoted",)
+
     def __init__(self, quoted):
-        self.quoted = "{}".format(quoted)
-        assert isinstance(self.quoted, str)
+        self.quoted = quoted
+        if DEBUG:
+            assert isinstance(self.quoted, str)
 
     def accept(self, visitor):
         res = visitor.visit_sub(self)
@@ -38,6 +55,8 @@ class Substitution(AST):
 
 
 class RedirectIn(AST):
+    __slots__ = ("arg",)
+
     def __init__(self, arg) -> None:
         self.arg = arg
 
@@ -46,6 +65,8 @@ class RedirectIn(AST):
 
 
 class RedirectOut(AST):
+    __slots__ = ("arg",)
+
     def __init__(self, arg) -> None:
         self.arg = arg
 
@@ -54,33 +75,42 @@ class RedirectOut(AST):
 
 
 class Call(AST):
+    __slots__ = ("redirects", "appName", "args")
+
     def __init__(self, redirects, appName, args) -> None:
         self.redirects = redirects
         self.appName = appName
         self.args = args
-        assert isinstance(args, Iterable)
-        assert all(isinstance(arg, Iterable) for arg in args)
-        assert len(redirects) <= 2
+        if DEBUG:
+            assert isinstance(args, Iterable)
+            assert all(isinstance(arg, Iterable) for arg in args)
+            assert len(redirects) <= 2
 
     def accept(self, visitor, input=None):
         return visitor.visit_call(self, in_put=input)
 
 
 class Seq(AST):
+    __slots__ = ("left", "right")
+
     def __init__(self, left, right) -> None:
         self.left = left
         self.right = right
-        assert left is not None and right is not None
+        if DEBUG:
+            assert left is not None and right is not None
 
     def accept(self, visitor):
         return visitor.visit_seq(self)
 
 
 class Pipe(AST):
+    __slots__ = ("left", "right")
+
     def __init__(self, left, right) -> None:
         self.left = left
         self.right = right
-        assert left is not None and right is not None
+        if DEBUG:
+            assert left is not None and right is not None
 
     def accept(self, visitor):
         return visitor.visit_pipe(self)
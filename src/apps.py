@@ -1,50 +1,129 @@
 import re
 import sys
 import os
-from os import listdir
 from collections import deque
-from abc import ABC
+from abc import ABC, abstractmethod
 import fnmatch
+import functools
+import grp
+import heapq
 import itertools
+import pwd
+import shutil
+import stat
 import subprocess
+import tempfile
+import threading
+import time
 from subprocess import Popen
+from queue import Full, Queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from commandhash import command_hash
+from filesource import FileInput, FileSource, note_read
+from findindex import FindIndex
+from linebatch import (
+    CHUNK_SIZE,
+    LineBatch,
+    close_stream,
+    decode,
+    encode,
+    iter_batches,
+    iter_bytes,
+    iter_lines,
+    read_batches,
+)
+
+
+def arg_max():
+    """
+    :returns: bytes the arguments of a new process may take, which is what
+              the system allows for its arguments and environment, less
+              the environment and the headroom xargs also leaves
+    """
+    try:
+        total = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        total = 128 * 1024
+    # each string takes a pointer besides its bytes and terminating null
+    env = sum(len(k) + len(v) + 10 for k, v in os.environb.items())
+    return total - env - 2048
 
 
 class Application(ABC):
     """Abstract Base Classes of Application"""
 
-    @classmethod
-    def exec(cls, args, stdin):
-        raise (Exception(NotImplementedError))
+    # whether the application only reads files and its output depends on
+    # nothing else, so that a substitution running it may be cached
+    PURE = True
+    # whether errors are raised rather than returned in stderr, which is
+    # only so for the safe variants made by AppDecorator
+    RAISES = False
+    # bytes the arguments of one run may take, or None if there is no
+    # limit; the matches of globs past it are split between several runs
+    ARG_MAX = None
+
+    def exec(self, args=None, stdin=None):
+        """
+        Compatibility adapter over stream, materialising stdout into a deque
+        :param args: Arguments
+        :param stdin: Standard input
+        :returns: A dictionary of Standard output, Standard Error and exit_code
+        """
+        std_dict = self.stream(args, stdin=stdin)
+        std_dict["stdout"] = deque(iter_lines(std_dict["stdout"]))
+        return std_dict
+
+    @abstractmethod
+    def stream(self, args, stdin=None):
+        """
+        :param args: Arguments
+        :param stdin: Standard input, any iterable of str lines or LineBatches
+        :returns: A dictionary of Standard output as a lazy iterator of str
+                  lines or LineBatches, Standard Error and exit_code
+        """
+
+
+def file_batches(file):
+    """
+    Opens file straight away, so a missing file is reported before any
+    output is produced, but only reads its LineBatches as they are consumed.
+    Large files are memory mapped, see FileSource.
+    """
+    source = FileSource(file)
+
+    def batches():
+        with source:
+            yield from source.batches()
+
+    return batches()
 
 
 class Pwd(Application):
     """Outputs the current working directory followed by a newline."""
 
-    def exec(self, args=None, stdin=None):
+    def stream(self, args=None, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
-        stdout.append(os.getcwd())
-        std_dict["stdout"] = stdout
+        std_dict["stdout"] = iter([os.getcwd()])
         return std_dict
 
 
 class Cd(Application):
     """Changes the current working directory."""
 
-    def exec(self, args, stdin=None):
+    PURE = False
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         if len(args) == 0 or len(args) > 1:
             std_dict["stderr"] = "Cd: Wrong number of command line arguments."
             std_dict["exit_code"] = "1"
@@ -55,7 +134,6 @@ class Cd(Application):
             std_dict["stderr"] = f"Cd: {args[0]}: No such file or directory"
             std_dict["exit_code"] = "1"
             return std_dict
-        std_dict["stdout"] = stdout
         return std_dict
 
 
@@ -64,37 +142,43 @@ class Echo(Application):
     Prints its arguments separated by spaces and followed by a newline to stdout
     """
 
-    def exec(self, args, stdin=None):
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
-        # print(args)
-        # print(" ".join(args) + "\n"=="".join(args) + "\n")
-        # stdout.append(" ".join(args) + "\n")
-        stdout.append(" ".join(args) + "\n")
-        std_dict["stdout"] = stdout
+        std_dict["stdout"] = iter([" ".join(args) + "\n"])
         return std_dict
 
 
-class Ls:
+class Ls(Application):
     """
     Lists the content of a directory.
     It prints a list of files and directories separated by tabs and followed by a newline.
     Ignores files and directories whose names start with `.`.
+    Entries are printed as they are read from the directory, so listing a huge one starts at once.
     """
 
-    def exec(self, args, stdin=None):
+    WORKERS = 8
+    # names whose lstat is looked up by one task of the -l thread pool
+    STAT_BATCH = 256
+    # a file modified longer ago than this shows its year instead of its time
+    RECENT = 182 * 24 * 3600
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
+        long = ordered = False
+        while args and args[0] in ("-l", "--sort"):
+            long = long or args[0] == "-l"
+            ordered = ordered or args[0] == "--sort"
+            args = args[1:]
         if len(args) == 0:
             ls_dir = os.getcwd()
         elif len(args) > 1:
@@ -105,69 +189,180 @@ class Ls:
             ls_dir = args[0]
 
         try:
-            lst_dir = listdir(ls_dir)
+            # opened straight away, so a missing directory is reported
+            # before any output is produced
+            listing = os.scandir(ls_dir)
         except Exception:
             std_dict["stderr"] = f"Ls: {ls_dir}: No such directory"
             std_dict["exit_code"] = "1"
             return std_dict
-        for file in lst_dir:
-            if not file.startswith("."):
-                stdout.append(file + "\n")
-        std_dict["stdout"] = stdout
+        names = self.names(listing)
+        if ordered:
+            names = self.sort_helper(names)
+        if long:
+            std_dict["stdout"] = self.long_helper(ls_dir, names)
+        else:
+            std_dict["stdout"] = (name + "\n" for name in names)
         return std_dict
 
+    @classmethod
+    def names(cls, listing):
+        with listing:
+            for entry in listing:
+                if not entry.name.startswith("."):
+                    yield entry.name
+
+    @classmethod
+    def sort_helper(cls, names):
+        """
+        Sorts names by their bytes with the external merge sort of Sort,
+        so a directory larger than the sort buffer is spilled to disk
+        """
+        batches = Sort.helper((name + "\n" for name in names), False)
+        return (line[:-1] for line in iter_lines(batches))
+
+    @classmethod
+    def long_helper(cls, ls_dir, names):
+        """
+        Looks up the lstat of names in a thread pool, at most a couple of
+        batches per worker ahead of the consumer, and yields the long
+        listing lines in the order of names
+        """
+        executor = ThreadPoolExecutor(max_workers=cls.WORKERS)
+        batches = iter(lambda: list(itertools.islice(names, cls.STAT_BATCH)), [])
+        pending = deque()
+        try:
+            pending.extend(
+                executor.submit(cls.long_lines, ls_dir, batch)
+                for batch in itertools.islice(batches, 2 * cls.WORKERS)
+            )
+            while pending:
+                found = pending.popleft().result()
+                for batch in itertools.islice(batches, 1):
+                    pending.append(executor.submit(cls.long_lines, ls_dir, batch))
+                yield from found
+        finally:
+            # the lookups not started yet are dropped if the listing is not
+            # read to the end
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    @classmethod
+    def long_lines(cls, ls_dir, names):
+        """
+        Runs in a worker thread of long_helper
+        :returns: list of the long listing lines of names
+        """
+        lines = []
+        now = time.time()
+        for name in names:
+            path = os.path.join(ls_dir, name)
+            note_read(path)
+            try:
+                info = os.lstat(path)
+                if stat.S_ISLNK(info.st_mode):
+                    name = f"{name} -> {os.readlink(path)}"
+            except FileNotFoundError:
+                # removed since the directory was read
+                continue
+            if abs(now - info.st_mtime) < cls.RECENT:
+                modified = time.strftime("%b %e %H:%M", time.localtime(info.st_mtime))
+            else:
+                modified = time.strftime("%b %e  %Y", time.localtime(info.st_mtime))
+            lines.append(
+                f"{stat.filemode(info.st_mode)} {info.st_nlink:>2} "
+                f"{user_name(info.st_uid)} {group_name(info.st_gid)} "
+                f"{info.st_size:>8} {modified} {name}\n"
+            )
+        return lines
+
+
+@functools.lru_cache(maxsize=None)
+def user_name(uid):
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return str(uid)
 
-class Cat:
+
+@functools.lru_cache(maxsize=None)
+def group_name(gid):
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return str(gid)
+
+
+class Cat(Application):
     """
     Concatenates the content of given files and prints it to stdout
     """
 
-    def exec(self, args, stdin=None):
+    def exec(self, args=None, stdin=None):
+        """
+        :param args: Arguments
+        :param stdin: Standard input
+        :returns: A dictionary of Standard output, Standard Error and exit_code
+        """
+        std_dict = self.stream(args, stdin=stdin)
+        # cat has always handed back the concatenation as a single chunk
+        content = "".join(iter_lines(std_dict["stdout"]))
+        std_dict["stdout"] = deque([content] if content else [])
+        return std_dict
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
-        if not stdin:
+        if args:
+            # missing files are reported before any output, but files are
+            # only opened as they are reached, so a glob matching more of
+            # them than may be open at once can be concatenated
             for a in args:
-                try:
-                    lines = self.file_helper(a)
-                    stdout.append(lines)
-                except FileNotFoundError:
+                note_read(a)
+                if not os.path.exists(a):
                     std_dict["stderr"] = f"Cat: {a}: No such file or directory"
                     std_dict["exit_code"] = "1"
                     return std_dict
+            stdout = self.files_helper(args)
 
         else:
-            stdout = stdin
+            stdout = iter(stdin or ())
 
         std_dict["stdout"] = stdout
         return std_dict
 
     @classmethod
     def file_helper(cls, file):
-        with open(file) as f:
-            lines = f.read()
-        return lines
+        return file_batches(file)
+
+    @classmethod
+    def files_helper(cls, files):
+        for file in files:
+            yield from cls.file_helper(file)
 
 
-class Head:
+class Head(Application):
     """
     Prints the first N lines of a given file or stdin.
     If there are less than N lines, prints only the existing lines without raising an exception.
+    With -c, prints the first N bytes instead.
+    Stops reading as soon as it has enough, and tells the stage before it to stop too.
     """
 
-    def exec(self, args, stdin=None):
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         num_lines = 10
+        byte_mode = False
         if len(args) == 1:
             num_lines = 10
             file = args[0]
@@ -178,78 +373,119 @@ class Head:
                 std_dict["exit_code"] = "1"
                 return std_dict
         elif len(args) == 2:
-            if args[0] == "-n":
+            if args[0] in ("-n", "-c"):
                 num_lines = int(args[1])
-                lines = list(stdin)
+                byte_mode = args[0] == "-c"
+                lines = stdin
             else:
                 std_dict["stderr"] = "Wrong Flags"
                 std_dict["exit_code"] = "1"
                 return std_dict
 
         elif len(args) == 3:
-            if args[0] == "-n":
+            if args[0] in ("-n", "-c"):
                 num_lines = int(args[1])
+                byte_mode = args[0] == "-c"
                 file = args[2]
             else:
                 std_dict["stderr"] = "Wrong Flags"
                 std_dict["exit_code"] = "1"
                 return std_dict
             try:
+                if byte_mode:
+                    std_dict["stdout"] = self.byte_file_helper(file, num_lines)
+                    return std_dict
                 lines = self.file_helper(file)
             except FileNotFoundError:
                 std_dict["stderr"] = f"Head: {file}: No such file or directory"
                 std_dict["exit_code"] = "1"
                 return std_dict
         else:
-            lines = list(stdin)
+            lines = stdin
 
-        stdout = self.helper(lines, num_lines)
-        std_dict["stdout"] = stdout
+        if byte_mode:
+            std_dict["stdout"] = self.byte_helper(lines, num_lines)
+        else:
+            std_dict["stdout"] = self.helper(lines, num_lines)
         return std_dict
 
     @classmethod
     def file_helper(cls, file):
-        with open(file, "r") as f:
-            lines = f.readlines()
-        return lines
+        return file_batches(file)
 
     @classmethod
-    def helper(cls, lines, num_lines):
-        output = deque()
-        display_length = min(len(lines), int(num_lines))
-        for i in range(0, display_length):
-            output.append(lines[i])
-        return output
+    def byte_file_helper(cls, file, num_bytes):
+        source = FileSource(file)
+
+        def chunks():
+            with source:
+                if not source.regular:
+                    yield from cls.byte_helper(source.batches(), num_bytes)
+                elif num_bytes > 0:
+                    # a single positioned read of just the bytes wanted
+                    data = bytes(source.read(0, num_bytes))
+                    if data:
+                        yield LineBatch.from_bytes(data)
+
+        return chunks()
 
+    @classmethod
+    def helper(cls, lines, num_lines):
+        remaining = int(num_lines)
+        if remaining > 0:
+            for batch in iter_batches(lines):
+                if len(batch) >= remaining:
+                    close_stream(lines)
+                    yield batch.slice(0, remaining)
+                    return
+                remaining -= len(batch)
+                yield batch
+        close_stream(lines)
 
-class Tail:
+    @classmethod
+    def byte_helper(cls, lines, num_bytes):
+        remaining = int(num_bytes)
+        if remaining > 0:
+            for chunk in iter_bytes(lines):
+                if len(chunk) >= remaining:
+                    close_stream(lines)
+                    yield LineBatch.from_bytes(bytes(chunk[:remaining]))
+                    return
+                remaining -= len(chunk)
+                yield LineBatch.from_bytes(bytes(chunk))
+        close_stream(lines)
+
+
+class Tail(Application):
     """
     Prints the last N lines of a given file or stdin.
     If there are less than N lines, prints only the existing lines without raising an exception.
     """
 
-    def exec(self, args, stdin=None):
+    # bytes read at a time when seeking backwards through a file
+    BLOCK_SIZE = 1 << 16
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         num_lines = 10
         if len(args) == 1:
             num_lines = 10
             file = args[0]
             try:
-                lines = self.file_helper(file)
+                std_dict["stdout"] = self.file_helper(file, num_lines)
             except FileNotFoundError:
                 std_dict["stderr"] = f"Tail: {file}: No such file or directory"
                 std_dict["exit_code"] = "1"
-                return std_dict
+            return std_dict
         elif len(args) == 2:
             if args[0] == "-n":
                 num_lines = int(args[1])
-                lines = list(stdin)
+                lines = stdin
             else:
                 std_dict["stderr"] = "Wrong Flags"
                 std_dict["exit_code"] = "1"
@@ -265,48 +501,97 @@ class Tail:
                 std_dict["exit_code"] = "1"
                 return std_dict
             try:
-                lines = self.file_helper(file)
+                std_dict["stdout"] = self.file_helper(file, num_lines)
             except FileNotFoundError:
                 std_dict["stderr"] = f"Tail: {file}: No such file or directory"
                 std_dict["exit_code"] = "1"
-                return std_dict
+            return std_dict
         else:
-            lines = list(stdin)
+            lines = stdin
 
-        stdout = self.helper(lines, num_lines)
+        std_dict["stdout"] = self.helper(lines, num_lines)
 
-        std_dict["stdout"] = stdout
         return std_dict
 
     @classmethod
-    def file_helper(cls, file):
-        with open(file, "r") as f:
-            lines = f.readlines()
-        return lines
+    def file_helper(cls, file, num_lines):
+        source = FileSource(file)
+
+        def batches():
+            with source:
+                if source.regular:
+                    yield from cls.seek_helper(source, num_lines)
+                else:
+                    yield from cls.helper(source.batches(), num_lines)
+
+        return batches()
+
+    @classmethod
+    def seek_helper(cls, source, num_lines):
+        """
+        Reads blocks backwards from the end of the file until it has passed
+        num_lines newlines, so only about the size of the output is read
+        """
+        end = len(source)
+        if num_lines <= 0 or end == 0:
+            return
+        # a newline at the very end closes the last line rather than
+        # starting another one
+        newlines = num_lines + (bytes(source.read(end - 1, end)) == b"\n")
+        blocks = []
+        start = end
+        while start > 0:
+            block_start = max(start - cls.BLOCK_SIZE, 0)
+            block = bytes(source.read(block_start, start))
+            found = block.count(b"\n")
+            if found >= newlines:
+                cut = len(block)
+                for _ in range(newlines):
+                    cut = block.rfind(b"\n", 0, cut)
+                blocks.append(block[cut + 1 :])
+                break
+            newlines -= found
+            blocks.append(block)
+            start = block_start
+        yield LineBatch.from_bytes(b"".join(reversed(blocks)))
 
     @classmethod
     def helper(cls, lines, num_lines):
-        output = deque()
-        display_length = min(len(lines), num_lines)
-        for i in range(0, min(len(lines), num_lines)):
-            output.append(lines[len(lines) - display_length + i])
-        return output
+        # only the last num_lines lines are ever kept
+        lines = deque(
+            itertools.chain.from_iterable(iter_batches(lines)),
+            maxlen=max(num_lines, 0),
+        )
+        if lines:
+            yield LineBatch.from_lines(lines)
 
 
-class Grep:
+class Grep(Application):
     """
     Searches for lines containing a match to the specified pattern.
     The output of the command is the list of lines. Each line is printed followed by a newline.
+    With -c, prints the number of matching lines of each file instead.
+    With -l, prints the name of each file with a match, and stops reading it at the first one.
     """
 
-    def exec(self, args, stdin=None):
+    # several files holding at least this many bytes between them are
+    # searched in parallel by a pool of processes
+    PARALLEL_THRESHOLD = 1 << 22
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
+        flags = set()
+        while len(args) > 1 and args[0] in ("-c", "-l"):
+            flags.add(args[0])
+            args = args[1:]
+        # as with GNU grep, -l wins over -c
+        mode = "-l" if "-l" in flags else "-c" if "-c" in flags else None
+
         if len(args) < 1:
             std_dict["stderr"] = "Grep: Wrong number of command line arguments"
             std_dict["exit_code"] = "1"
@@ -314,42 +599,161 @@ class Grep:
         if len(args) > 1:
             pattern = args[0]
             files = args[1:]
+            size = 0
             for file in files:
                 try:
-                    lines = self.file_helper(file)
-                    for line in lines:
-                        if re.match(pattern, line):
-                            if len(files) > 1:
-                                stdout.append(f"{file}:{line}")
-                            else:
-                                stdout.append(line)
+                    size += os.path.getsize(file)
                 except FileNotFoundError:
                     std_dict["stderr"] = f"Grep: {file}: No such file or directory"
                     std_dict["exit_code"] = "1"
                     return std_dict
-            std_dict["stdout"] = stdout
+            prefixed = len(files) > 1
+            parallel = (os.cpu_count() or 1) > 1 and size >= self.PARALLEL_THRESHOLD
+            if prefixed and parallel:
+                std_dict["stdout"] = self.parallel_helper(pattern, files, mode)
+                return std_dict
+            std_dict["stdout"] = self.files_helper(pattern, files, mode)
             return std_dict
 
         pattern = args[0]
-        for line in list(stdin):
-            if re.match(pattern, line):
-                stdout.append(line)
-        std_dict["stdout"] = stdout
+        std_dict["stdout"] = self.search(pattern, stdin, "(standard input)", False, mode)
         return std_dict
 
     @classmethod
     def file_helper(cls, file):
-        with open(file, "r") as f:
-            lines = f.readlines()
-        return lines
+        return file_batches(file)
+
+    @classmethod
+    def files_helper(cls, pattern, files, mode):
+        """
+        Searches files one after the other, each opened only once the search
+        reaches it and closed when done, so a glob matching more of them
+        than may be open at once can be searched
+        """
+        prefixed = len(files) > 1
+        for file in files:
+            lines = cls.file_helper(file)
+            try:
+                yield from cls.search(pattern, lines, file, prefixed, mode)
+            finally:
+                close_stream(lines)
+
+    @classmethod
+    def search(cls, pattern, lines, name, prefixed, mode):
+        prefix = f"{name}:" if prefixed else ""
+        if mode == "-l":
+            return cls.list_helper(pattern, lines, name)
+        if mode == "-c":
+            return cls.count_helper(pattern, lines, prefix)
+        return cls.helper(pattern, lines, prefix)
+
+    @classmethod
+    def helper(cls, pattern, lines, prefix=""):
+        matcher = compile_pattern(pattern)
+        prefix = encode(prefix)
+        for batch in iter_batches(lines):
+            match = matcher(batch)
+            matched = [line for line in batch if match(line)]
+            if matched:
+                if prefix:
+                    matched = [prefix + line for line in matched]
+                yield LineBatch.from_lines(matched)
 
+    @classmethod
+    def count_helper(cls, pattern, lines, prefix=""):
+        matcher = compile_pattern(pattern)
+        count = 0
+        for batch in iter_batches(lines):
+            match = matcher(batch)
+            count += sum(1 for line in batch if match(line))
+        yield f"{prefix}{count}\n"
 
-class Cut:
+    @classmethod
+    def list_helper(cls, pattern, lines, name):
+        matcher = compile_pattern(pattern)
+        for batch in iter_batches(lines):
+            match = matcher(batch)
+            if any(match(line) for line in batch):
+                close_stream(lines)
+                yield f"{name}\n"
+                return
+
+    @classmethod
+    def parallel_helper(cls, pattern, files, mode):
+        """
+        Searches files in a process pool, at most a couple of files per
+        worker ahead of the consumer, and yields the results in the order
+        of the files
+        """
+        workers = min(len(files), os.cpu_count() or 1)
+        for file in files:
+            # the files are opened by the workers
+            note_read(file)
+        executor = ProcessPoolExecutor(max_workers=workers)
+        files = iter(files)
+        pending = deque()
+        try:
+            pending.extend(
+                executor.submit(search_file, pattern, file, mode)
+                for file in itertools.islice(files, 2 * workers)
+            )
+            while pending:
+                found = pending.popleft().result()
+                for file in itertools.islice(files, 1):
+                    pending.append(executor.submit(search_file, pattern, file, mode))
+                if found:
+                    yield LineBatch.from_bytes(found)
+        finally:
+            # if the results are not read to the end, the few searches
+            # submitted are left to finish before the pool is shut down:
+            # on 3.8, shutting it down with work cancelled or still queued
+            # may never return, or leave the workers behind
+            wait(pending)
+            executor.shutdown()
+
+
+# finds a byte which is not ASCII, without copying a batch to look at it
+non_ascii = re.compile(rb"[\x80-\xff]").search
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    """
+    Compiled patterns are shared by every grep run by this process
+    :returns: function of a LineBatch returning the function matching its
+              lines against pattern, as bytes when both are ASCII, and else
+              decoded so that characters are matched whole
+    """
+    text_match = re.compile(pattern).match
+
+    def decoded_match(line):
+        return text_match(decode(line))
+
+    if not pattern.isascii():
+        return lambda batch: decoded_match
+    try:
+        bytes_match = re.compile(encode(pattern)).match
+    except re.error:
+        # e.g. "\u00e9", which only text patterns understand
+        return lambda batch: decoded_match
+    return lambda batch: decoded_match if non_ascii(batch.view()) else bytes_match
+
+
+def search_file(pattern, file, mode):
+    """
+    Runs in a worker process of Grep.parallel_helper
+    :returns: bytes of everything grep prints for file
+    """
+    lines = Grep.file_helper(file)
+    return b"".join(iter_bytes(Grep.search(pattern, lines, file, True, mode)))
+
+
+class Cut(Application):
     """
     Cuts out sections from each line of a given file or stdin and prints the result to stdout.
     """
 
-    def exec(self, args, stdin=None):
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
@@ -357,7 +761,6 @@ class Cut:
         """
         lines = None
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         if len(args) > 3:
             std_dict["stderr"] = "Cut: Wrong number of command line arguments"
             std_dict["exit_code"] = "1"
@@ -377,18 +780,16 @@ class Cut:
                     std_dict["exit_code"] = "1"
                     return std_dict
                 pattern = args[1]
-                input = list(stdin)
-                lines = []
-                [lines.extend(i.splitlines()) for i in input]
+                lines = stdin
             else:
                 err = "Cut: Wrong number of command line arguments"
                 std_dict["stderr"] = err
                 std_dict["exit_code"] = "1"
                 return std_dict
 
-        pattern_list = pattern.split(",")
+        plan = self.parse_plan(pattern)
 
-        if not lines:
+        if lines is None:
             try:
                 lines = self.file_helper(file)
 
@@ -396,135 +797,291 @@ class Cut:
                 std_dict["stderr"] = f"Cut: {file}: No such file or directory"
                 std_dict["exit_code"] = "1"
                 return std_dict
-                # If the cut command uses the -b option,
-                # then cut will sort all the positions
-                # after -b from small to large, and then
-                # extract them.
 
-        stdout = self.cut_helper(lines, pattern_list)
-        std_dict["stdout"] = stdout
+        std_dict["stdout"] = (
+            LineBatch.from_lines(self.cut_helper(batch.split(), plan))
+            for batch in iter_batches(lines)
+        )
         return std_dict
 
     @classmethod
-    def cut_helper(cls, lines, pattern_list):
-        result = deque()
-        for line in lines:
-            start_list = []
-            end_list = []
-            byte_list = []
-            cut_line = ""
-            for p in pattern_list:
-                if "-" in p:
-                    start_i, end_i = p.split("-")
-                    start_i = 1 if start_i == "" else int(start_i)
-                    end_i = len(line) if end_i == "" else int(end_i)
-                    start_list.append(int(start_i) - 1)
-                    end_list.append(int(end_i) - 1)
-                else:
-                    byte_list.append(int(p) - 1)
-            for i in range(len(line)):
-                if i in byte_list:
-                    cut_line += line[i]
-                else:
-                    for j in range(len(start_list)):
-                        if start_list[j] <= i <= end_list[j]:
-                            cut_line += line[i]
-                            break
-            result.append(cut_line + "\n")
-        return result
+    def parse_plan(cls, pattern):
+        """
+        Parses a byte list such as "1,3-5,7-" once into sorted, merged
+        intervals (start, stop) of 0-based positions, where stop is None
+        for a range running to the end of the line. Like cut, every byte
+        is printed at most once and in the order of the line.
+        """
+        intervals = []
+        for p in pattern.split(","):
+            if "-" in p:
+                start_i, end_i = p.split("-")
+                start = 0 if start_i == "" else int(start_i) - 1
+                stop = None if end_i == "" else int(end_i)
+            else:
+                start = int(p) - 1
+                stop = start + 1
+            # a negative start would count from the end of the line
+            start = max(start, 0)
+            if stop is None or start < stop:
+                intervals.append((start, stop))
+
+        plan = []
+        for start, stop in sorted(intervals, key=lambda interval: interval[0]):
+            if plan and (plan[-1][1] is None or start <= plan[-1][1]):
+                last_start, last_stop = plan[-1]
+                if last_stop is not None and (stop is None or stop > last_stop):
+                    plan[-1] = (last_start, stop)
+            else:
+                plan.append((start, stop))
+        return plan
 
     @classmethod
-    def file_helper(cls, file):
-        with open(file, "r") as f:
-            lines = f.read().splitlines()
+    def cut_helper(cls, lines, plan):
+        """
+        :param lines: lines as bytes, without their newlines
+        """
+        # slicing past the end of a line is empty, so open-ended and
+        # too-long ranges work without knowing the length of the line
+        if len(plan) == 1:
+            start, stop = plan[0]
+            return [line[start:stop] + b"\n" for line in lines]
+        return [
+            b"".join([line[start:stop] for start, stop in plan]) + b"\n"
+            for line in lines
+        ]
 
-        return lines
+    @classmethod
+    def file_helper(cls, file):
+        return file_batches(file)
 
 
-class Uniq:
+class Uniq(Application):
     """
     Detects and deletes adjacent duplicate lines from an input file/stdin and prints the result to stdout.
+    With -c, prefixes every line with the number of times it occurred.
+    With --global, removes or counts duplicates anywhere in the input, not only adjacent ones.
     """
 
-    def exec(self, args, stdin=None):
+    # memory budget for the distinct lines kept by --global, beyond which
+    # they are spilled to PARTITIONS temporary files by hash
+    BUFFER_SIZE = 64 << 20
+    PARTITIONS = 16
+    # approximate cost of a distinct line on top of its bytes: its key,
+    # its entry in the table and the list holding its index and count
+    ENTRY_OVERHEAD = 200
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
-        ignore = False
+        flags = set()
+        while args and args[0] in ("-i", "-c", "--global"):
+            flags.add(args[0])
+            args = args[1:]
+        ignore = "-i" in flags
+        count = "-c" in flags
+        helper = self.global_helper if "--global" in flags else self.helper
 
         if len(args) > 2:
             std_dict["stderr"] = "Uniq: Wrong number of command line arguments"
             std_dict["exit_code"] = "1"
             return std_dict
         if len(args) == 2:
-            if args[0] == "-i":
-                ignore = True
-            else:
-                std_dict["stderr"] = "Uniq: Wrong Flags"
-                std_dict["exit_code"] = "1"
-                return std_dict
-            file = args[1]
+            std_dict["stderr"] = "Uniq: Wrong Flags"
+            std_dict["exit_code"] = "1"
+            return std_dict
+        if len(args) == 1:
+            file = args[0]
             try:
-                stdout = self.file_helper(file, ignore)
-                std_dict["stdout"] = stdout
+                std_dict["stdout"] = helper(ignore, self.file_helper(file), count)
             except FileNotFoundError:
-                std_dict["stderr"] = f"Uniq: {file}: No such file or directory"
+                errMessage = f"Uniq: {file}: No such file or directory"
+                std_dict["stderr"] = errMessage
                 std_dict["exit_code"] = "1"
             return std_dict
-        if len(args) == 1:
-            if args[0] == "-i":
-                ignore = True
-            else:
-                file = args[0]
-                try:
-                    stdout = self.file_helper(file, ignore)
-                    std_dict["stdout"] = stdout
-                except FileNotFoundError:
-                    errMessage = f"Uniq: {file}: No such file or directory"
-                    std_dict["stderr"] = errMessage
-                    std_dict["exit_code"] = "1"
-                return std_dict
 
-        lines = []
-        [lines.extend(i.splitlines(True)) for i in list(stdin)]
-        stdout = self.helper(ignore, lines)
-        std_dict["stdout"] = stdout
+        std_dict["stdout"] = helper(ignore, stdin, count)
         return std_dict
 
     @classmethod
-    def file_helper(cls, file, ignore):
-        with open(file, "r") as f:
-            lines = f.readlines()
-            output = cls.helper(ignore, lines)
-        return output
+    def file_helper(cls, file):
+        return file_batches(file)
+
+    @classmethod
+    def helper(cls, ignore, lines, count=False):
+        """
+        Compares every line with the previous one only, so it runs in
+        constant memory
+        """
+        previous = first = None
+        repeats = 0
+        for batch in iter_batches(lines):
+            output = []
+            for line in batch:
+                # only a case insensitive comparison needs the decoded text
+                key = decode(line).casefold() if ignore else line
+                if repeats and key == previous:
+                    repeats += 1
+                    continue
+                if not count:
+                    output.append(line)
+                elif repeats:
+                    output.append(cls.counted(first, repeats))
+                previous, first, repeats = key, line, 1
+            if repeats:
+                # copy the last line, so the batch it is in can be released
+                first = bytes(first)
+                previous = previous if ignore else first
+            if output:
+                yield LineBatch.from_lines(output)
+        if count and repeats:
+            yield LineBatch.from_lines([cls.counted(first, repeats)])
 
     @classmethod
-    def helper(cls, ignore, lines):
-        result = deque()
-        output = (
-            [k for k, g in itertools.groupby(lines)]
-            if not ignore
-            else [
-                n
-                for i, n in enumerate(lines)
-                if i == 0 or n.casefold() != lines[i - 1].casefold()
-            ]
-        )
-        for i in output:
-            result.append(i)
-        return result
+    def global_helper(cls, ignore, lines, count=False):
+        """
+        Keeps every distinct line in a hash table, with the index and the
+        number of its occurrences. Without -c, lines are printed as soon as
+        they are first seen. Once the table passes BUFFER_SIZE it is
+        spilled to partitions by hash, and the rest of the output waits
+        until the end, when the partitions are reduced one at a time and
+        merged back in the order the lines were first seen.
+        """
+        table = {}
+        size = 0
+        partitions = None
+        # lines first seen before this index have been printed already
+        printed = 0
+        index = 0
+        try:
+            for batch in iter_batches(lines):
+                output = []
+                for line in batch:
+                    key = decode(line).casefold() if ignore else bytes(line)
+                    entry = table.get(key)
+                    if entry is not None:
+                        entry[1] += 1
+                    else:
+                        line = bytes(line)
+                        table[key] = [index, 1, line]
+                        size += len(line) + cls.ENTRY_OVERHEAD
+                        if not count and partitions is None:
+                            output.append(line)
+                    index += 1
+                if not count and partitions is None:
+                    printed = index
+                if output:
+                    yield LineBatch.from_lines(output)
+                if size >= cls.BUFFER_SIZE:
+                    if partitions is None:
+                        partitions = [tempfile.TemporaryFile() for _ in range(cls.PARTITIONS)]
+                    cls.spill(table, partitions)
+                    table, size = {}, 0
+
+            if partitions is None:
+                entries = (e for e in table.values() if e[0] >= printed)
+            else:
+                cls.spill(table, partitions)
+                table = None
+                entries = cls.merge_partitions(partitions, ignore, printed)
+            for chunk in Sort.chunks(entries):
+                if count:
+                    chunk = [cls.counted(line, n) for _, n, line in chunk]
+                else:
+                    chunk = [line for _, _, line in chunk]
+                yield LineBatch.from_lines(chunk)
+        finally:
+            for f in partitions or ():
+                f.close()
+
+    @classmethod
+    def spill(cls, table, partitions):
+        """
+        Appends every entry of table to the partition picked by the hash of
+        its key
+        """
+        records = [[] for _ in partitions]
+        for key, entry in table.items():
+            records[hash(key) % len(partitions)].append(cls.record(entry))
+        for f, lines in zip(partitions, records):
+            f.writelines(lines)
+
+    @classmethod
+    def merge_partitions(cls, partitions, ignore, printed):
+        """
+        Sums up the counts of every key of each partition, which holds all
+        the occurrences of its keys, and merges the partitions by the index
+        of the first occurrence of each key
+        :returns: iterator of [index, count, line] in the order of index
+        """
+        for f in partitions:
+            table = {}
+            for index, n, line in cls.read_partition(f):
+                key = decode(line).casefold() if ignore else line
+                entry = table.get(key)
+                if entry is None:
+                    table[key] = [index, n, line]
+                else:
+                    if index < entry[0]:
+                        entry[0], entry[2] = index, line
+                    entry[1] += n
+            entries = sorted(e for e in table.values() if e[0] >= printed)
+            del table
+            f.seek(0)
+            f.truncate()
+            f.writelines(map(cls.record, entries))
+        return heapq.merge(*map(cls.read_partition, partitions))
+
+    @classmethod
+    def record(cls, entry):
+        """
+        :returns: "index count newline content" on one line, where newline
+                  tells whether the line ended with one
+        """
+        index, n, line = entry
+        newline = line[-1:] == b"\n"
+        return b"%d %d %d %s\n" % (index, n, newline, line[:-1] if newline else line)
+
+    @classmethod
+    def read_partition(cls, f):
+        f.seek(0)
+        for record in f:
+            index, n, newline, content = record[:-1].split(b" ", 3)
+            yield [int(index), int(n), content + b"\n" if newline == b"1" else content]
+
+    @classmethod
+    def counted(cls, line, repeats):
+        # the format of GNU uniq -c
+        return b"%7d %s" % (repeats, line)
 
 
-class Sort:
+class Sort(Application):
     """
     Sorts the contents of a file/stdin line by line and prints the result to stdout.
+    Inputs larger than the buffer are sorted in runs which are spilled to
+    temporary files and merged back together. With --parallel N, large
+    runs are split into parts sorted by N processes.
     """
 
-    def exec(self, args, stdin=None):
+    OUTPUT_LINES = 4096
+    # memory budget for the lines held at once, -S
+    BUFFER_SIZE = 256 << 20
+    # directory for the spilled runs, -T, None for the tempfile default
+    TEMP_DIR = None
+    # the most runs merged at once, each needs an open file and a buffer
+    MERGE_WIDTH = 64
+    # approximate cost of a line on top of its bytes: a bytes object and
+    # its slot in the list
+    LINE_OVERHEAD = sys.getsizeof(b"") + 8
+    # smaller runs are sorted in this process even with --parallel, as
+    # sending them to another one would take longer than sorting them
+    PARALLEL_THRESHOLD = 1 << 22
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
@@ -532,7 +1089,12 @@ class Sort:
         """
         reverse = False
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
+        try:
+            options, args = self.parse_options(args)
+        except ValueError:
+            std_dict["stderr"] = "Sort: Wrong Flags"
+            std_dict["exit_code"] = "1"
+            return std_dict
         if len(args) > 2:
             std_dict["stderr"] = "Sort: Wrong number of command line arguments"
             std_dict["exit_code"] = "1"
@@ -547,7 +1109,7 @@ class Sort:
             file = args[1]
 
             try:
-                stdout = self.file_helper(file, reverse)
+                stdout = self.file_helper(file, reverse, **options)
                 std_dict["stdout"] = stdout
             except FileNotFoundError:
                 std_dict["stderr"] = f"Sort: {file}: No such file or directory"
@@ -560,7 +1122,7 @@ class Sort:
             else:
                 file = args[0]
                 try:
-                    stdout = self.file_helper(file, reverse)
+                    stdout = self.file_helper(file, reverse, **options)
                     std_dict["stdout"] = stdout
                 except FileNotFoundError:
                     errMessage = f"Sort: {file}: No such file or directory"
@@ -568,48 +1130,189 @@ class Sort:
                     std_dict["exit_code"] = "1"
                 return std_dict
 
-        lines = []
-        input = list(stdin)
-        [lines.extend(i.splitlines()) for i in input]
-        stdout = self.helper(lines, reverse)
+        stdout = self.helper(stdin, reverse, **options)
         std_dict["stdout"] = stdout
         return std_dict
 
     @classmethod
-    def file_helper(cls, file, reverse):
-        with open(file, "r") as f:
-            lines = f.read().splitlines()
-            output = cls.helper(lines, reverse)
-        return output
+    def parse_options(cls, args):
+        """
+        Takes "-S SIZE", "-T DIR" and "--parallel N" out of args, wherever
+        they are
+        :returns: keyword arguments for helper and the remaining args
+        """
+        options = {}
+        rest = []
+        args = iter(args)
+        for arg in args:
+            if arg == "--parallel" or arg.startswith("--parallel="):
+                value = arg[len("--parallel=") :] or next(args, "")
+                options["parallel"] = int(value)
+                if options["parallel"] < 1:
+                    raise ValueError(f"invalid number of processes {value}")
+                continue
+            if arg in ("-S", "-T"):
+                value = next(args, None)
+                if value is None:
+                    raise ValueError(f"{arg} needs a value")
+            elif arg[:2] in ("-S", "-T"):
+                arg, value = arg[:2], arg[2:]
+            else:
+                rest.append(arg)
+                continue
+            if arg == "-S":
+                options["buffer_size"] = cls.parse_size(value)
+            else:
+                options["temp_dir"] = value
+        return options, rest
 
     @classmethod
-    def helper(cls, lines, reverse):
-        output = deque()
-        lines.sort()
-        if reverse:
-            lines.reverse()
-            for i in lines:
-                output.append(i + "\n")
+    def parse_size(cls, size):
+        """
+        Parses a buffer size like GNU sort does: in KiB, unless it ends in
+        b for bytes or K, M or G
+        """
+        units = {"B": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+        unit = units.get(size[-1:].upper())
+        if unit is None:
+            number, unit = size, units["K"]
         else:
-            for i in lines:
-                output.append(i + "\n")
-        return output
+            number = size[:-1]
+        size = int(number) * unit
+        if size <= 0:
+            raise ValueError(f"invalid buffer size {size}")
+        return size
+
+    @classmethod
+    def file_helper(cls, file, reverse, **options):
+        return cls.helper(file_batches(file), reverse, **options)
+
+    # UTF-8 bytes sort in the same order as the code points they encode
+    @classmethod
+    def helper(cls, lines, reverse, buffer_size=None, temp_dir=None, parallel=1):
+        buffer_size = cls.BUFFER_SIZE if buffer_size is None else buffer_size
+        temp_dir = cls.TEMP_DIR if temp_dir is None else temp_dir
+        runs = []
+        # more processes than CPUs would only add overhead
+        parallel = min(parallel, os.cpu_count() or 1)
+        # the processes are only started once a run is sent to them
+        executor = ProcessPoolExecutor(max_workers=parallel) if parallel > 1 else None
+        try:
+            run, size = [], 0
+            for batch in iter_batches(lines):
+                run.extend(batch.split())
+                size += len(batch.view()) + cls.LINE_OVERHEAD * len(batch)
+                if size >= buffer_size:
+                    parts = cls.sort_run(run, size, reverse, executor, parallel)
+                    merged = heapq.merge(*parts, reverse=reverse)
+                    runs.append(cls.spill(cls.chunks(merged), temp_dir))
+                    run, size = [], 0
+            parts = cls.sort_run(run, size, reverse, executor, parallel)
+            del run
+
+            # merge the spilled runs a few at a time, so that the last merge
+            # and the run still in memory need few open files
+            while len(runs) >= cls.MERGE_WIDTH:
+                group = runs[: cls.MERGE_WIDTH]
+                merged = heapq.merge(*map(cls.read_run, group), reverse=reverse)
+                runs.append(cls.spill(cls.chunks(merged), temp_dir))
+                for f in group:
+                    f.close()
+                del runs[: cls.MERGE_WIDTH]
+
+            merged = heapq.merge(*parts, *map(cls.read_run, runs), reverse=reverse)
+            for chunk in cls.chunks(merged):
+                chunk.append(b"")
+                yield LineBatch.from_bytes(b"\n".join(chunk))
+        finally:
+            if executor is not None:
+                # every part submitted has been sorted by now
+                executor.shutdown()
+            for f in runs:
+                f.close()
+
+    @classmethod
+    def sort_run(cls, run, size, reverse, executor, parallel):
+        """
+        Sorts run in place or, if it holds at least PARALLEL_THRESHOLD
+        bytes, splits it into parts sorted by the processes of executor
+        :returns: list of sorted lists, which hold the lines of run between them
+        """
+        if executor is None or size < cls.PARALLEL_THRESHOLD or len(run) < 2:
+            run.sort(reverse=reverse)
+            return [run]
+        step = -(-len(run) // parallel)
+        # a part travels as a single bytes object, much cheaper to pickle
+        # than a list of lines
+        parts = [b"\n".join(run[i : i + step]) for i in range(0, len(run), step)]
+        run.clear()
+        futures = [executor.submit(sort_part, part, reverse) for part in parts]
+        try:
+            return [future.result().split(b"\n") for future in futures]
+        finally:
+            # if a worker fails, the other parts are still left to finish,
+            # as cancelling them may hang the shutdown of the pool on 3.8
+            wait(futures)
+
+    @classmethod
+    def chunks(cls, lines):
+        """
+        :returns: iterator of lists of up to OUTPUT_LINES lines
+        """
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, cls.OUTPUT_LINES))
+            if not chunk:
+                return
+            yield chunk
 
+    @classmethod
+    def spill(cls, chunks, temp_dir):
+        """
+        Writes a sorted run to a temporary file, removed once it is closed
+        :param chunks: iterable of lists of lines without newlines
+        """
+        f = tempfile.TemporaryFile(dir=temp_dir, buffering=CHUNK_SIZE)
+        for chunk in chunks:
+            if chunk:
+                f.write(b"\n".join(chunk))
+                f.write(b"\n")
+        f.seek(0)
+        return f
 
-class Find:
+    @classmethod
+    def read_run(cls, f):
+        # the newlines are left out, as "\n" would sort after "\t"
+        return (line[:-1] for line in f)
+
+
+def sort_part(data, reverse):
+    """
+    Runs in a worker process of Sort.sort_run
+    :param data: lines joined by newlines
+    """
+    lines = data.split(b"\n")
+    lines.sort(reverse=reverse)
+    return b"\n".join(lines)
+
+
+class Find(Application):
     """
     Recursively searches for files with matching names.
     Outputs the list of relative paths, each followed by a newline.
+    Directories are explored by several threads, so the order of the paths may vary.
+    A directory indexed by updatedb is searched through its index instead.
     """
 
-    def exec(self, args, stdin=None):
+    WORKERS = 8
+
+    def stream(self, args, stdin=None):
         """
         :param args: Arguments
         :param stdin: Standard input
         :returns: A dictionary of Standard output, Standard Error and exit_code
         """
         std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         if len(args) > 3:
             std_dict["stderr"] = "Find: Wrong number of command line arguments"
             std_dict["exit_code"] = "1"
@@ -629,37 +1332,392 @@ class Find:
             pattern = args[1]
             dict = "."
 
-        res = self.helper(pattern, [dict], [])
-        for i in res:
-            stdout.append(i + "\n")
+        index = FindIndex.load(dict)
+        if index is not None:
+            # brought up to date with the tree before it is used
+            if index.refresh():
+                index.save()
+            std_dict["stdout"] = index.find(pattern)
+            return std_dict
 
-        std_dict["stdout"] = stdout
+        # the starting directory is opened straight away, so a missing one
+        # is reported before any output is produced
+        listing = os.scandir(dict)
+        std_dict["stdout"] = self.helper(pattern, dict, listing)
         return std_dict
 
     @classmethod
-    def helper(cls, pattern, stack, res):
-        while stack:
+    def helper(cls, pattern, root, listing=None):
+        """
+        :returns: iterator of matching paths, each followed by a newline,
+                  which are produced as the walk finds them, so a consumer
+                  such as head can stop it early
+        """
+        return iter(_Walker(pattern, root, listing, cls.WORKERS))
+
+
+class Updatedb(Application):
+    """
+    Builds or refreshes the index of a directory tree used by find.
+    Only directories changed since the last run are listed again, unless --rebuild is given.
+    """
+
+    PURE = False
+
+    def stream(self, args, stdin=None):
+        """
+        :param args: Arguments
+        :param stdin: Standard input
+        :returns: A dictionary of Standard output, Standard Error and exit_code
+        """
+        std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
+        rebuild = bool(args) and args[0] == "--rebuild"
+        if rebuild:
+            args = args[1:]
+        if len(args) > 1:
+            std_dict["stderr"] = "Updatedb: Wrong number of command line arguments"
+            std_dict["exit_code"] = "1"
+            return std_dict
+        root = args[0] if args else "."
+
+        index = None if rebuild else FindIndex.load(root)
+        if index is None:
+            index = FindIndex(root)
+        try:
+            index.refresh()
+        except (FileNotFoundError, NotADirectoryError):
+            std_dict["stderr"] = f"Updatedb: {root}: No such directory"
+            std_dict["exit_code"] = "1"
+            return std_dict
+        index.save()
+        return std_dict
+
+
+class Hash(Application):
+    """
+    Shows or changes the table of where the commands run outside the shell
+    were found in PATH. Without arguments, lists every command found with
+    the number of times it has run. With -r, forgets them all. Names given
+    are looked for in PATH again and remembered.
+    """
+
+    PURE = False
+
+    def stream(self, args, stdin=None):
+        """
+        :param args: Arguments
+        :param stdin: Standard input
+        :returns: A dictionary of Standard output, Standard Error and exit_code
+        """
+        std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
+        if args and args[0] == "-r":
+            command_hash.clear()
+            args = args[1:]
+        elif not args:
+            entries = command_hash.entries()
+            if not entries:
+                std_dict["stdout"] = iter(["hash: hash table empty\n"])
+                return std_dict
+            lines = ["hits\tcommand\n"]
+            lines.extend(f"{e.hits:4}\t{e.path}\n" for e in entries.values())
+            std_dict["stdout"] = iter(lines)
+            return std_dict
+
+        for name in args:
+            if name.startswith("-"):
+                std_dict["stderr"] = "Hash: Wrong Flags"
+                std_dict["exit_code"] = "1"
+                return std_dict
+            if command_hash.add(name, LocalApp._search_path) is None:
+                std_dict["stderr"] = f"Hash: {name}: not found"
+                std_dict["exit_code"] = "1"
+                return std_dict
+        return std_dict
 
-            current = stack.pop()
-            dirs = os.listdir(current)
 
-            for d in dirs:
-                d1 = os.path.join(current, d)
-                if not os.path.isdir(d1):
-                    if fnmatch.fnmatch(d, pattern):
-                        res.append("/".join([current, d]))
+class _Walker:
+    """
+    Walks a directory tree with a pool of threads. Every thread explores
+    directories depth first from its own deque, and steals the oldest,
+    usually largest, directory of another thread when its own runs out.
+    Entries come from os.scandir, whose cached d_type saves a stat per
+    file. Matches are sent to the consumer through a bounded queue,
+    a directory at a time.
+    """
 
+    QUEUE_SIZE = 64
+
+    _DONE = object()
+
+    def __init__(self, pattern, root, listing, workers):
+        pattern = os.path.normcase(pattern)
+        self._match = re.compile(fnmatch.translate(pattern)).match
+        self._workers = workers
+        self._deques = [deque() for _ in range(workers)]
+        self._deques[0].append((root, listing))
+        # directories waiting in a deque or being scanned
+        self._pending = 1
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._results = Queue(maxsize=self.QUEUE_SIZE)
+        self._stopped = threading.Event()
+
+    def __iter__(self):
+        for i in range(self._workers):
+            worker = threading.Thread(target=self._work, args=(i,))
+            worker.daemon = True
+            worker.start()
+        try:
+            running = self._workers
+            while running:
+                item = self._results.get()
+                if item is self._DONE:
+                    running -= 1
+                elif isinstance(item, BaseException):
+                    raise item
                 else:
-                    stack.append("/".join([current, d]))
+                    yield from item
+        finally:
+            self.close()
 
-        return res
+    def close(self):
+        with self._lock:
+            self._stopped.set()
+            self._changed.notify_all()
+
+    def _work(self, i):
+        try:
+            while True:
+                task = self._next(i)
+                if task is None:
+                    return
+                found, subdirs = self._scan(*task)
+                with self._lock:
+                    self._deques[i].extend((d, None) for d in subdirs)
+                    self._pending += len(subdirs) - 1
+                    if subdirs or not self._pending:
+                        self._changed.notify_all()
+                if found and not self._put(found):
+                    return
+        except Exception as e:
+            self._put(e)
+            self.close()
+        finally:
+            self._put(self._DONE)
+
+    def _next(self, i):
+        with self._lock:
+            while not self._stopped.is_set() and self._pending:
+                if self._deques[i]:
+                    return self._deques[i].pop()
+                for other in self._deques:
+                    if other:
+                        return other.popleft()
+                self._changed.wait()
+        return None
+
+    def _scan(self, current, listing):
+        found, subdirs = [], []
+        match = self._match
+        with listing or os.scandir(current) as entries:
+            for entry in entries:
+                path = "/".join([current, entry.name])
+                # as with GNU find, symbolic links are not followed, which
+                # also keeps the walk out of cycles
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(path)
+                elif match(os.path.normcase(entry.name)):
+                    found.append(path + "\n")
+        return found, subdirs
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._results.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
 
 
-class LocalApp:
+class ProcessOutput:
+    """
+    Stdout of a process run by LocalApp, as a lazy iterator of LineBatches.
+    The process starts at once, as in bash, whether its output is read or
+    not. A LocalApp given it as stdin before anything is read from it
+    takes its pipe over: the two processes are connected by an OS pipe,
+    so the output never passes through the interpreter.
+    """
+
+    def __init__(self, name, args, stdin):
+        self.name = name
+        self.args = args
+        self.stdin = stdin
+        self._batches = None
+        self._taken = False
+        self._start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._batches is None:
+            if self._taken:
+                raise StopIteration
+            self._batches = self._read()
+        return next(self._batches)
+
+    def close(self):
+        if self._batches is not None:
+            self._batches.close()
+
+    @property
+    def unread(self):
+        return self._batches is None and not self._taken
+
+    def take(self):
+        """
+        :returns: the pipe of the stdout of the process, for a process
+                  reading it itself, or None if reading it has begun
+        """
+        if not self.unread:
+            return None
+        self._taken = True
+        return self._process.stdout
+
+    def write_to(self, f):
+        """
+        Copies the output as it is, chunk by chunk, to the binary file f,
+        e.g. the file of an output redirection
+        """
+        pipe = self.take()
+        finished = False
+        try:
+            shutil.copyfileobj(pipe, f, CHUNK_SIZE)
+            finished = True
+        finally:
+            self._finish(kill=not finished)
+
+    def wait(self):
+        """
+        Waits for the process if nothing has read its output, as a shell
+        waits for every command of a pipeline; like there, the process gets
+        SIGPIPE if it writes anything
+        """
+        pipe = self.take()
+        if pipe is not None:
+            pipe.close()
+            self._finish()
+
+    def _read(self):
+        finished = False
+        try:
+            yield from read_batches(self._process.stdout)
+            finished = True
+        finally:
+            # if the consumer stopped early, nobody will read the rest
+            self._finish(kill=not finished)
+
+    def _start(self):
+        stdin, upstream, first = self.stdin, None, None
+        if isinstance(stdin, (FileInput, ProcessOutput)):
+            taken = stdin.take()
+        else:
+            taken = None
+        if taken is not None:
+            # the process reads the file of an input redirection, or the
+            # pipe of the process before it, itself
+            pipe = taken
+            if isinstance(stdin, ProcessOutput):
+                upstream = stdin
+        else:
+            # an empty stdin behaves as if there were no stdin at all
+            stdin = iter(stdin or ())
+            first = next(stdin, None)
+            pipe = subprocess.PIPE if first is not None else None
+
+        try:
+            process = Popen(
+                self.args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=pipe
+            )
+        except BaseException:
+            if upstream is not None:
+                upstream._finish(kill=True)
+            raise
+        finally:
+            # only the processes hold the ends of a pipe between them, so
+            # the first gets SIGPIPE if the second exits without reading all
+            if taken is not None:
+                taken.close()
+
+        self._process, self._upstream = process, upstream
+        self._errors, self._failures = deque(), deque()
+        self._workers = [
+            threading.Thread(target=self._errors.extend, args=(process.stderr,))
+        ]
+        if first is not None:
+            lines = iter_bytes(itertools.chain([first], stdin))
+            self._workers.append(
+                threading.Thread(
+                    target=self._feed,
+                    args=(process.stdin, lines, self._failures, stdin),
+                )
+            )
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    def _finish(self, kill=False):
+        """
+        Waits for the process, and for those before it in the pipeline,
+        then raises their errors, first to last, unless they were killed
+        """
+        process, workers = self._process, self._workers
+        if kill:
+            process.kill()
+            workers = workers[:1]
+        process.wait()
+        for worker in workers:
+            worker.join()
+        process.stdout.close()
+        process.stderr.close()
+
+        if self._upstream is not None:
+            self._upstream._finish(kill)
+        if kill:
+            return
+        if self._failures:
+            raise self._failures[0]
+        error = decode(b"".join(self._errors))
+        if error != "":
+            raise Exception(f"{self.name}: " + error)
+
+    @classmethod
+    def _feed(cls, pipe, lines, failures, source):
+        try:
+            for line in lines:
+                pipe.write(line)
+        except BrokenPipeError:
+            # the process exited or was killed without reading everything,
+            # so the stage before it can stop as well
+            close_stream(source)
+        except Exception as e:
+            failures.append(e)
+        finally:
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+
+class LocalApp(Application):
     '''
     Make applications in the same directory, same environment path, or otherwise provided app become callable
     '''
 
+    PURE = False
+    ARG_MAX = arg_max()
+
     def __init__(self, appName):
         self.app = appName
 
@@ -673,6 +1731,11 @@ class LocalApp:
                 return self.app
             return None
 
+        # names found in PATH are remembered, see the hash builtin
+        return command_hash.lookup(app, self._search_path)
+
+    @classmethod
+    def _search_path(cls, app):
         # get a mess of concatenated system path
         path = os.environ.get("PATH", None)
         if path is None:
@@ -684,12 +1747,12 @@ class LocalApp:
         path = path.split(os.pathsep)
 
         # windows has to check file extension
-        possibleExecutable = self._get_system_executables(app, path)
+        possibleExecutable = cls._get_system_executables(app, path)
 
         for p in path:
             for executable in possibleExecutable:
                 executablePath = os.path.join(os.path.normcase(p), executable)
-                if self._is_valid_path_to_executable(executablePath) is not None:
+                if cls._is_valid_path_to_executable(executablePath) is not None:
                     return executablePath
 
     @classmethod
@@ -732,35 +1795,18 @@ class LocalApp:
             return None
 
     def exec(self, args=[], stdin=deque()):
-        std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
-        stdout = deque()
         assert type(stdin) == deque and type(args) == list
+        std_dict = self.stream(args, stdin=stdin)
+        if not std_dict["stderr"]:
+            # the whole output of the process is handed back as one chunk
+            std_dict["stdout"] = deque(["".join(iter_lines(std_dict["stdout"]))])
+        return std_dict
+
+    def stream(self, args=[], stdin=None):
+        std_dict = {"stdout": deque(), "stderr": deque(), "exit_code": 0}
         sysApp = self._getApp()
         if sysApp is not None:
-            stdin = "".join(stdin)
-            args = [sysApp] + args
-            if len(stdin) > 0:
-                process = Popen(
-                    args,
-                    universal_newlines=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    stdin=subprocess.PIPE,
-                )
-                output, error = process.communicate(stdin)
-            else:
-                process = Popen(
-                    args,
-                    universal_newlines=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                )
-                output, error = process.communicate()
-            if error == "":
-                stdout.append(output)
-            else:
-                raise Exception(f"{self.app}: " + error)
+            std_dict["stdout"] = ProcessOutput(self.app, [sysApp] + args, stdin)
         else:
             std_dict["stderr"] = f"No application {self.app} is found\n"
-        std_dict["stdout"] = stdout
         return std_dict
@@ -11,8 +11,11 @@ from apps import (
     Find,
     Sort,
     Uniq,
+    Updatedb,
+    Hash,
     LocalApp,
 )
+import copy
 import re
 
 
@@ -31,8 +34,15 @@ def singleton(cls):
 @singleton
 class AppDecorator:
     def decorateSafe(self, cls):
-        originalExec = cls.exec
+        # decorate a copy, the menu instance is shared with the unsafe variant
+        safe = copy.copy(cls)
+        safe.exec = self._raiseOnError(cls.exec)
+        safe.stream = self._raiseOnError(cls.stream)
+        safe.RAISES = True
+        return safe
 
+    @classmethod
+    def _raiseOnError(cls, originalExec):
         def newExec(args, stdin=None):
 
             executedProcess = originalExec(args, stdin=stdin)
@@ -41,8 +51,7 @@ class AppDecorator:
             else:
                 return executedProcess
 
-        cls.exec = newExec
-        return cls
+        return newExec
 
     def decorateUnsafe(self, cls):
         return cls
@@ -64,6 +73,8 @@ class AppsFactory:
             "find": Find(),
             "sort": Sort(),
             "uniq": Uniq(),
+            "updatedb": Updatedb(),
+            "hash": Hash(),
         }
 
         self.appType = {
@@ -75,7 +86,16 @@ class AppsFactory:
             ),
         }
 
+        # decorated applications hold no state of their own, so one of each
+        # is shared by every call
+        self.apps = {}
+
     def getApp(self, appName, *remain):
+        app = self.apps.get(appName)
+        if app is not None:
+            return app
         for regex, decorator in self.appType.items():
             if re.search(regex, appName):
-                return decorator(appName, self.menu, LocalApp)
+                app = decorator(appName, self.menu, LocalApp)
+                self.apps[appName] = app
+                return app
@@ -0,0 +1,79 @@
+"""
+    this is a command hash module
+    to remember where the commands run outside the shell were found in PATH
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+HashEntry = namedtuple("HashEntry", ["hits", "path"])
+
+
+class CommandHash:
+    """
+    Table from command names to the executables found for them in PATH,
+    like the hash table of bash, so PATH is searched once per name rather
+    than on every run. Names found nowhere are remembered too, as None.
+    The whole table is forgotten when PATH changes, and an executable is
+    looked for again once its path is no longer executable.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._path = None
+        self._lock = threading.Lock()
+
+    def lookup(self, name, search, count=True):
+        """
+        :param search: function of name returning the executable found for
+                       it in PATH, or None
+        :param count: whether this is a run of name, counted in its hits
+        :returns: the executable of name, or None if there is none
+        """
+        path_var = os.environ.get("PATH")
+        hit = 1 if count else 0
+        with self._lock:
+            if path_var != self._path:
+                self._entries.clear()
+                self._path = path_var
+            entry = self._entries.get(name)
+        if entry is not None and (
+            entry.path is None or os.access(entry.path, os.X_OK)
+        ):
+            with self._lock:
+                self._entries[name] = entry._replace(hits=entry.hits + hit)
+            return entry.path
+
+        found = search(name)
+        with self._lock:
+            if self._path == path_var:
+                self._entries[name] = HashEntry(hit, found)
+        return found
+
+    def add(self, name, search):
+        """
+        Searches PATH for name again, as the hash builtin does
+        :returns: the executable of name, or None if there is none
+        """
+        with self._lock:
+            self._entries.pop(name, None)
+        return self.lookup(name, search, count=False)
+
+    def entries(self):
+        """
+        :returns: dictionary of the names found in PATH to their HashEntry
+        """
+        with self._lock:
+            return {
+                name: entry
+                for name, entry in self._entries.items()
+                if entry.path is not None
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+command_hash = CommandHash()
@@ -0,0 +1,358 @@
+"""
+    this is a compiler module
+    to turn command ASTs into closures that run without visiting the tree
+"""
+
+from collections import deque
+from glob import escape, has_magic
+from itertools import chain
+import os
+from abstract_syntax_tree import (
+    Call,
+    DoubleQuote,
+    Pipe,
+    RedirectIn,
+    RedirectOut,
+    Seq,
+    SingleQuote,
+    Substitution,
+)
+from appsFactory import AppsFactory
+from filesource import note_read
+from globbing import Listings, Replay, iglob
+from linebatch import iter_lines
+from parsecache import ParseCache, parse
+from subcache import sub_cache
+from visitor import ConcurrentASTVisitor, StreamingASTVisitor
+
+
+class Compiler:
+    """
+    Compiles a command AST into a plan: a function of the stdin of the
+    command, or None, which returns the same dictionary of stdout, stderr
+    and exit_code as evaluating the AST with StreamingASTVisitor.
+    Applications, redirection files and arguments without substitutions
+    or globs are resolved once, when the plan is built, so a plan run
+    again only evaluates substitutions and globs.
+    Anything unusual, such as an application name in double quotes or
+    invalid redirections, is left to the visitor, which raises the error.
+    """
+
+    def __init__(self, visitor=None):
+        self.visitor = StreamingASTVisitor() if visitor is None else visitor
+        self.factory = AppsFactory()
+
+    def compile(self, ast):
+        if isinstance(ast, Seq):
+            return self.compile_seq(ast)
+        if isinstance(ast, Pipe):
+            return self.compile_pipe(ast)
+        if isinstance(ast, Call):
+            return self.compile_call(ast)
+        return self.fallback(ast)
+
+    def fallback(self, ast):
+        visitor = self.visitor
+
+        def run_visitor(stdin=None):
+            if stdin is None:
+                return ast.accept(visitor)
+            return ast.accept(visitor, input=stdin)
+
+        return run_visitor
+
+    def compile_seq(self, seq):
+        left, right = self.compile(seq.left), self.compile(seq.right)
+
+        def run_seq(stdin=None):
+            # the left command has to finish before the right one starts
+            out_left = left()
+            stdout_left = deque(out_left["stdout"])
+            out_right = right()
+
+            stderr = deque(out_left["stderr"])
+            stderr.extend(out_right["stderr"])
+
+            return {
+                "stdout": chain(stdout_left, out_right["stdout"]),
+                "stderr": stderr,
+                "exit_code": out_left["exit_code"] or out_right["exit_code"],
+            }
+
+        return run_seq
+
+    def compile_pipe(self, pipe):
+        stages = [self.compile(stage) for stage in self.visitor._getStages(pipe)]
+        connect = self.visitor._connect
+        wait_unread = self.visitor._waitUnread
+
+        def run_pipe(stdin=None):
+            executed = stages[0]()
+            outs = [executed["stdout"]]
+            stderr = deque(executed["stderr"])
+            exit_code = executed["exit_code"]
+
+            for stage in stages[1:]:
+                executed = stage(connect(executed["stdout"]))
+                outs.append(executed["stdout"])
+                stderr.extend(executed["stderr"])
+                exit_code = exit_code or executed["exit_code"]
+
+            return {
+                "stdout": wait_unread(outs[-1], outs[:-1]),
+                "stderr": stderr,
+                "exit_code": exit_code,
+            }
+
+        return run_pipe
+
+    def compile_call(self, call):
+        redirects_in = [r for r in call.redirects if isinstance(r, RedirectIn)]
+        redirects_out = [r for r in call.redirects if isinstance(r, RedirectOut)]
+        if len(redirects_in) > 1 or len(redirects_out) > 1:
+            return self.fallback(call)
+
+        get_app = self.compile_app_name(call.appName)
+        if get_app is None:
+            return self.fallback(call)
+        read_in = self.compile_redirect_in(redirects_in[0]) if redirects_in else None
+        write_out = self.compile_redirect_out(redirects_out[0]) if redirects_out else None
+        get_args = self.compile_args(call.args)
+        execute = self.visitor._execute
+
+        def run_call(stdin=None):
+            app = get_app()
+            # a redirection replaces the output of the previous command
+            if read_in is not None:
+                stdin = read_in()
+            elif not stdin:
+                stdin = deque()
+
+            out, err = execute(app, get_args(app.ARG_MAX), stdin)
+
+            if write_out is not None:
+                write_out(out)
+                return {"stdout": deque(), "stderr": err, "exit_code": len(err)}
+            return {"stdout": out, "stderr": err, "exit_code": len(err)}
+
+        return run_call
+
+    def compile_app_name(self, name):
+        """
+        :returns: function returning the application to run, or None if
+                  the name is left to the visitor
+        """
+        factory = self.factory
+        if isinstance(name, str):
+            app = factory.getApp(name)
+            return lambda: app
+        if not isinstance(name, Substitution):
+            return None
+        sub = self.compile_sub(name)
+
+        def substituted_app():
+            executed = sub()
+            if executed["exit_code"] != 0:
+                raise Exception(f"Cannot substitute {name} as app name")
+            return factory.getApp("".join(executed["stdout"]).strip(" \n"))
+
+        return substituted_app
+
+    def compile_redirect_in(self, redirect):
+        path = redirect.arg
+        read_files = self.visitor._readFiles
+        if escape(path) != path:
+            visitor = self.visitor
+            return lambda: redirect.accept(visitor)["stdout"]
+
+        def read_in():
+            # noted, as a missing file is never opened for the cache to see
+            note_read(path)
+            if not os.path.lexists(path):
+                raise FileNotFoundError
+            return read_files([path])
+
+        return read_in
+
+    def compile_redirect_out(self, redirect):
+        path = redirect.arg
+        if escape(path) != path:
+            visitor = self.visitor
+            return lambda out: redirect.accept(visitor, stdin=out)
+
+        write = self.visitor._writeOut
+
+        def write_out(out):
+            with open(path, "wb") as f:
+                write(f, out)
+
+        return write_out
+
+    def compile_args(self, args):
+        """
+        :returns: function of the ARG_MAX of the application, returning
+                  the argument lists it is run with, as a list or, in the
+                  "product" glob mode, as an iterator expanding the globs
+                  lazily
+        """
+        plans = [self.compile_arg(arg) for arg in args]
+        if all(isinstance(parts, str) and pattern is None for parts, pattern in plans):
+            static = [parts for parts, _ in plans]
+            # applications get their own copy, which they are free to change
+            return lambda arg_max=None: [list(static)]
+
+        get_globbed_arg = self.visitor._getGlobbedArg
+
+        def evaluate_args(arg_max=None):
+            parsed_arg, glob_index, globbed_result = [], [], []
+            listings = Listings()
+            for n, (parts, pattern) in enumerate(plans):
+                if not isinstance(parts, str):
+                    values = [p if isinstance(p, str) else p() for p in parts]
+                    parts = "".join(values)
+                    if pattern is not None:
+                        pattern = "".join(
+                            escape(v) if q is None else q for q, v in zip(pattern, values)
+                        )
+                parsed_arg.append(parts)
+                if pattern is not None:
+                    glob_index.append(n)
+                    globbed_result.append(Replay(iglob(pattern, listings)))
+
+            if glob_index:
+                return get_globbed_arg(parsed_arg, glob_index, globbed_result, arg_max)
+            return [parsed_arg]
+
+        return evaluate_args
+
+    def compile_arg(self, arg):
+        """
+        :returns: (parts, pattern), where parts is the argument if it is
+                  static, or else a list of strings and of functions
+                  returning strings, and pattern is None if the argument
+                  is not globbed, or else its glob pattern, in the same
+                  form, with quoted parts escaped and None in place of
+                  the functions, whose results are escaped
+        """
+        parts, pattern, globbed = [], [], False
+        for part in arg:
+            if isinstance(part, SingleQuote):
+                part = part.quotedPart
+                literal = escape(part)
+            elif isinstance(part, DoubleQuote):
+                if part.containSubstitution:
+                    part = self.compile_double_quote(part)
+                    literal = None
+                else:
+                    part = "".join(part.quotedPart)
+                    literal = escape(part)
+            elif isinstance(part, Substitution):
+                part = self.compile_sub_arg(part)
+                literal = None
+            else:
+                globbed = globbed or has_magic(part)
+                literal = part
+            # neighbouring strings are joined, so most arguments end up
+            # as a single string
+            if isinstance(part, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += part
+                pattern[-1] += literal
+            else:
+                parts.append(part)
+                pattern.append(literal)
+
+        if not globbed:
+            pattern = None
+        if all(isinstance(p, str) for p in parts):
+            return "".join(parts), None if pattern is None else "".join(pattern)
+        return parts, pattern
+
+    def compile_double_quote(self, double_quote):
+        parts = []
+        for part in double_quote.quotedPart:
+            if isinstance(part, Substitution):
+                parts.append(self.compile_sub(part))
+            elif parts and isinstance(parts[-1], str):
+                parts[-1] += part
+            else:
+                parts.append(part)
+
+        def evaluate_double_quote():
+            res, err = [], deque()
+            # every substitution runs, even after one has failed
+            for part in parts:
+                if isinstance(part, str):
+                    res.append(part)
+                else:
+                    executed = part()
+                    err.extend(executed["stderr"])
+                    res.append("".join(executed["stdout"]))
+            if err:
+                raise Exception(err)
+            return "".join(res)
+
+        return evaluate_double_quote
+
+    def compile_sub_arg(self, sub):
+        run_sub = self.compile_sub(sub)
+
+        def evaluate_sub():
+            executed = run_sub()
+            if executed["exit_code"]:
+                raise Exception(executed["stderr"])
+            return "".join(executed["stdout"])
+
+        return evaluate_sub
+
+    def compile_sub(self, sub):
+        """
+        :returns: function returning the result of visit_sub for sub
+        """
+        try:
+            ast = parse(sub.quoted)
+            plan = self.compile(ast)
+        except Exception:
+            # the visitor raises the error when the substitution runs
+            visitor = self.visitor
+            return lambda: sub.accept(visitor)
+
+        def run_sub():
+            executed = plan()
+            out = "".join(iter_lines(executed["stdout"]))
+
+            return {
+                "stdout": deque(out.strip("\n ").replace("\n", " ")),
+                "stderr": executed["stderr"],
+                "exit_code": executed["exit_code"],
+            }
+
+        if sub_cache.enabled and sub_cache.eligible(ast):
+            return lambda: sub_cache.run(sub.quoted, run_sub)
+        return run_sub
+
+
+class ConcurrentCompiler(Compiler):
+    """
+    Compiler of plans that run like ConcurrentASTVisitor, with every
+    stage of a pipeline in its own thread
+    """
+
+    def __init__(self, visitor=None):
+        super().__init__(ConcurrentASTVisitor() if visitor is None else visitor)
+
+
+class PlanCache(ParseCache):
+    """
+    Least recently used cache from command text to its plan, so a command
+    line run again is neither parsed nor compiled again. Plans are
+    closures, which cannot be saved to a file.
+    """
+
+    FILE = None
+
+    def __init__(self, compiler, maxsize=None):
+        super().__init__(lambda text: compiler.compile(parse(text)), maxsize)
+
+
+plan_cache = PlanCache(Compiler())
+concurrent_plan_cache = PlanCache(ConcurrentCompiler())
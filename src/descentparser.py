@@ -0,0 +1,162 @@
+"""
+    this is a descent parser module
+    to parse command lines in a single pass, without parser combinators
+"""
+
+import re
+from sys import intern
+
+from parsy import ParseError
+
+import abstract_syntax_tree
+
+# every token is told apart by its first character, so the scan never
+# backtracks further than the token it is matching
+TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+    | (?P<unquoted>[^\s'"`;|<>]+)
+    | (?P<single>'[^'\n]*')
+    | (?P<back>`[^`\n]*`)
+    | (?P<double>"(?:`[^`\n]*`|[^\n`"])*")
+    | (?P<op>[;|<>])
+    """,
+    re.VERBOSE,
+)
+DOUBLE_PART = re.compile(r"`([^`]*)`|[^`]+")
+
+QUOTED = ("single", "back", "double")
+# tokens that can start the name of an application
+CALL_NAME = ("unquoted", "back", "double")
+
+
+def tokenize(text):
+    """
+    :returns: list of (kind, value, index) tuples, ended by an eof token,
+              where value is the AST of quoted tokens
+    """
+    tokens = []
+    index, length = 0, len(text)
+    while index < length:
+        match = TOKEN.match(text, index)
+        if match is None:
+            # a quote that is not closed on its line
+            raise ParseError({"closing quote"}, text, index)
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "unquoted":
+            value = intern(value)
+        elif kind == "single":
+            value = abstract_syntax_tree.SingleQuote(intern(value[1:-1]))
+        elif kind == "back":
+            value = abstract_syntax_tree.Substitution(value[1:-1])
+        elif kind == "double":
+            value = double_quote(value[1:-1])
+        tokens.append((kind, value, index))
+        index = match.end()
+    tokens.append(("eof", None, length))
+    return tokens
+
+
+def double_quote(text):
+    # the parts are the substitutions of the quote and the runs of
+    # characters between them, like those of parsercombinator.doubleQuoted
+    parts = []
+    has_sub = False
+    for match in DOUBLE_PART.finditer(text):
+        if match.group(1) is None:
+            parts.append(intern(match.group()))
+        else:
+            parts.append(abstract_syntax_tree.Substitution(match.group(1)))
+            has_sub = True
+    return abstract_syntax_tree.DoubleQuote(parts, has_sub)
+
+
+class Parser:
+    """
+    Recursive descent parser over the tokens of a command line, which
+    builds the same AST as parsercombinator.command
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position]
+
+    def next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def skip_space(self):
+        if self.tokens[self.position][0] == "space":
+            self.position += 1
+
+    def error(self, expected):
+        return ParseError({expected}, self.text, self.peek()[2])
+
+    def command(self):
+        basis = self.call()
+        while True:
+            kind, value, _ = self.peek()
+            if kind == "eof":
+                return basis
+            if kind != "op" or value not in ";|":
+                raise self.error("';' or '|'")
+            self.position += 1
+            if value == ";":
+                basis = abstract_syntax_tree.Seq(basis, self.call())
+            else:
+                basis = abstract_syntax_tree.Pipe(basis, self.call())
+
+    def call(self):
+        redirects = []
+        self.skip_space()
+        while self.peek()[0] == "op" and self.peek()[1] in "<>":
+            redirects.append(self.redirection())
+            self.skip_space()
+
+        kind, name, _ = self.peek()
+        if kind not in CALL_NAME:
+            raise self.error("application name")
+        self.position += 1
+
+        # every argument is made of the quoted and unquoted parts up to the
+        # next space, operator or end of line
+        args = []
+        while True:
+            self.skip_space()
+            kind, value, _ = self.peek()
+            if kind == "op" and value in "<>":
+                redirects.append(self.redirection())
+            elif kind == "unquoted" or kind in QUOTED:
+                arg = []
+                while kind == "unquoted" or kind in QUOTED:
+                    arg.append(value)
+                    self.position += 1
+                    kind, value, _ = self.peek()
+                args.append(arg)
+            else:
+                return abstract_syntax_tree.Call(redirects, name, args)
+
+    def redirection(self):
+        _, sign, _ = self.next()
+        self.skip_space()
+        kind, target, _ = self.peek()
+        if kind != "unquoted":
+            raise self.error("file name")
+        self.position += 1
+        if sign == "<":
+            return abstract_syntax_tree.RedirectIn(target)
+        return abstract_syntax_tree.RedirectOut(target)
+
+
+def parse(text):
+    """
+    :returns: AST of the command line text
+    :raises ParseError: if text is not a command
+    """
+    return Parser(text).command()
@@ -0,0 +1,158 @@
+"""
+    this is a file source module
+    to read files for applications through memory maps
+"""
+
+import mmap
+import os
+import stat
+import sys
+
+from linebatch import CHUNK_SIZE, LineBatch, read_batches
+
+# audit event of files read without being opened by this process
+READ_EVENT = "comp0010.read"
+
+
+def note_read(path):
+    """
+    Reports that path is read, for reads that raise no audit event of
+    their own, such as a stat or an open by a worker process, so that the
+    substitution cache can track them
+    """
+    sys.audit(READ_EVENT, path)
+
+
+class FileSource:
+    """
+    Read-only access to the bytes of a file, by line batch or at random.
+    Regular files of at least MMAP_THRESHOLD bytes are memory mapped, so
+    their pages come from the OS page cache rather than copies on the heap.
+    Smaller files, and anything that cannot be mapped such as a pipe, fall
+    back to ordinary buffered reads.
+    """
+
+    MMAP_THRESHOLD = int(os.environ.get("COMP0010_MMAP_THRESHOLD", 1 << 20))
+
+    def __init__(self, path, threshold=None):
+        threshold = self.MMAP_THRESHOLD if threshold is None else threshold
+        self.path = path
+        self.data = None
+        self._file = open(path, "rb")
+
+        info = os.fstat(self._file.fileno())
+        self.regular = stat.S_ISREG(info.st_mode)
+        self.size = info.st_size if self.regular else None
+        if self.regular and 0 < self.size and threshold <= self.size:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._file.close()
+
+    @property
+    def mapped(self):
+        return self.data is not None
+
+    def __len__(self):
+        if not self.regular:
+            raise TypeError(f"{self.path} is not a regular file")
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.mapped:
+            try:
+                self.data.close()
+            except BufferError:
+                # batches still refer to the pages, they are unmapped once
+                # the last of them is released
+                pass
+        self._file.close()
+
+    def read(self, start, end):
+        """
+        Random access to a regular file, which does not move the position
+        of batches
+        :returns: bytes-like object of the bytes from start to end, a view
+                  of the mapped pages when the file is mapped
+        """
+        if self.mapped:
+            return memoryview(self.data)[start:end]
+        return os.pread(self._file.fileno(), max(end - start, 0), start)
+
+    def batches(self, size=CHUNK_SIZE):
+        """
+        :returns: iterator of LineBatches of roughly size bytes each, which
+                  share the mapped pages instead of copying them
+        """
+        if not self.mapped:
+            yield from read_batches(self._file, size)
+            return
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.data.madvise(mmap.MADV_SEQUENTIAL)
+
+        data, buffer = self.data, memoryview(self.data)
+        start, total = 0, len(data)
+        while start < total:
+            end = min(start + size, total)
+            if end < total:
+                # end the batch after its last newline, or after the first
+                # one beyond it when a single line is longer than size
+                cut = data.rfind(b"\n", start, end) + 1
+                if cut <= start:
+                    cut = data.find(b"\n", end) + 1 or total
+                end = cut
+            yield LineBatch.from_buffer(buffer, start, end)
+            start = end
+
+    def lines(self):
+        """
+        :returns: iterator of lines as memoryview slices, newlines included
+        """
+        for batch in self.batches():
+            yield from batch
+
+
+class FileInput:
+    """
+    LineBatches of the files of an input redirection, read one after the
+    other as they are consumed. A process run by LocalApp takes a single
+    file over before anything is read from it, and reads it itself.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self._batches = None
+        self._taken = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._batches is None:
+            if self._taken:
+                raise StopIteration
+            self._batches = self._read()
+        return next(self._batches)
+
+    def close(self):
+        if self._batches is not None:
+            self._batches.close()
+
+    def take(self):
+        """
+        :returns: the file opened for reading, to be closed by the caller,
+                  or None if there are several files or reading has begun
+        """
+        if self._batches is not None or self._taken or len(self.paths) != 1:
+            return None
+        self._taken = True
+        return open(self.paths[0], "rb")
+
+    def _read(self):
+        for path in self.paths:
+            with open(path, "rb") as f:
+                yield from read_batches(f)
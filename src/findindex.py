@@ -0,0 +1,136 @@
+"""
+    this is a find index module
+    to answer find from a saved listing of a directory tree
+"""
+
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import time
+
+from filesource import note_read
+
+
+def default_directory():
+    directory = os.environ.get("COMP0010_FIND_INDEX_DIR")
+    if directory:
+        return directory
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache, "comp0010", "find")
+
+
+class FindIndex:
+    """
+    Listing of every directory under a root, saved to disk between runs.
+    Each directory is kept with its mtime, its files and its
+    subdirectories. A refresh stats every directory, but only lists again
+    those whose mtime has changed, which is much cheaper than a full walk
+    on large or remote trees.
+    """
+
+    VERSION = 1
+    DIRECTORY = default_directory()
+    # a directory modified this recently may change again within the same
+    # mtime tick, so its listing is not trusted on the next refresh
+    SETTLE_NS = 2 * 10**9
+
+    def __init__(self, root, dirs=None):
+        self.root = root
+        # relative path ("" for the root) -> (mtime_ns, files, subdirs)
+        self.dirs = {} if dirs is None else dirs
+
+    @classmethod
+    def path(cls, root):
+        key = hashlib.sha1(os.fsencode(os.path.abspath(root))).hexdigest()
+        return os.path.join(cls.DIRECTORY, key + ".pickle")
+
+    @classmethod
+    def load(cls, root):
+        """
+        :returns: the saved index of root, or None if there is none
+        """
+        try:
+            with open(cls.path(root), "rb") as f:
+                version, dirs = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if version != cls.VERSION:
+            return None
+        return cls(root, dirs)
+
+    def save(self):
+        path = self.path(self.root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write a new file and rename it over the old one, so concurrent
+        # readers never see half an index
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.VERSION, self.dirs), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+    def refresh(self):
+        """
+        Lists again the directories whose mtime has changed, drops those
+        that are gone and adds the new ones
+        :returns: whether anything has changed
+        """
+        old, new = self.dirs, {}
+        changed = False
+        now = time.time_ns()
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            path = self._join(self.root, rel)
+            note_read(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                entry = old.get(rel)
+                if entry is None or entry[0] != mtime:
+                    entry = self._scan(path, mtime, now)
+                    changed = True
+            except (FileNotFoundError, NotADirectoryError):
+                if not rel:
+                    raise
+                # removed since its parent was listed
+                continue
+            new[rel] = entry
+            stack.extend(f"{rel}/{d}" if rel else d for d in entry[2])
+        changed = changed or len(new) != len(old)
+        self.dirs = new
+        return changed
+
+    def find(self, pattern):
+        """
+        :returns: iterator of the paths of files whose names match pattern,
+                  each followed by a newline, like Find
+        """
+        match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+        for rel, (_, files, _) in self.dirs.items():
+            found = [f for f in files if match(os.path.normcase(f))]
+            if found:
+                directory = self._join(self.root, rel)
+                yield from ("/".join([directory, f]) + "\n" for f in found)
+
+    @classmethod
+    def _scan(cls, path, mtime, now):
+        files, subdirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        if now - mtime < cls.SETTLE_NS:
+            mtime = None
+        return (mtime, tuple(files), tuple(subdirs))
+
+    @classmethod
+    def _join(cls, root, rel):
+        return "/".join([root, rel]) if rel else root
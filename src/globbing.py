@@ -0,0 +1,238 @@
+"""
+    this is a globbing module
+    to expand glob patterns lazily, listing each directory once per command
+"""
+
+import fnmatch
+import functools
+from glob import has_magic
+import os
+import re
+
+from filesource import note_read
+
+# the component of a pattern matching any number of directories
+RECURSIVE = "**"
+
+
+class Replay:
+    """
+    Iterable over the items of an iterator which may be iterated again and
+    again, reading from the iterator only as far as the furthest of its
+    iterations has got
+    """
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._items = []
+
+    def __iter__(self):
+        items = self._items
+        i = 0
+        while True:
+            if i == len(items):
+                try:
+                    items.append(next(self._iterator))
+                except StopIteration:
+                    return
+            yield items[i]
+            i += 1
+
+
+def product(*iterables):
+    """
+    Like itertools.product, which reads every iterable to the end before
+    yielding anything, but yields the first tuples as soon as their items
+    are read. All iterables but the first are iterated again for every
+    item of those before them, so they should be Replays.
+    """
+    if not iterables:
+        yield ()
+        return
+    rest = iterables[1:]
+    for item in iterables[0]:
+        for items in product(*rest):
+            yield (item,) + items
+
+
+class Listings:
+    """
+    Entries of the directories listed while expanding the globs of one
+    command, so that each directory is listed once however many arguments
+    are matched in it
+    """
+
+    def __init__(self):
+        self._listings = {}
+
+    def entries(self, dirname):
+        """
+        :returns: the DirEntries of dirname, none if it cannot be listed
+        """
+        return self._listing(dirname)[0]
+
+    def names(self, dirname):
+        return self._listing(dirname)[1]
+
+    def _listing(self, dirname):
+        # "dir" and "dir/" are the same directory
+        key = dirname.rstrip(os.sep) or dirname
+        listing = self._listings.get(key)
+        if listing is None:
+            try:
+                with os.scandir(key or os.curdir) as it:
+                    entries = list(it)
+            except OSError:
+                entries = []
+            listing = self._listings[key] = (entries, [e.name for e in entries])
+        return listing
+
+
+def compile_component(pattern):
+    """
+    :returns: the match method of a regex matching the names a path
+              component with magic matches, which are not hidden unless the
+              pattern starts with a dot
+    """
+    regex = fnmatch.translate(pattern)
+    if not pattern.startswith("."):
+        regex = r"(?!\.)" + regex
+    return re.compile(regex).match
+
+
+@functools.lru_cache(maxsize=256)
+def compile_pattern(pathname):
+    """
+    :returns: (base, components), where base is the leading directories of
+              pathname without magic, which are never listed, and each of
+              the other components is kept as a str if it has no magic, as
+              RECURSIVE if it is "**", or else compiled by
+              compile_component. An empty last component, of a pattern
+              ending with a slash, only matches directories.
+    """
+    parts = pathname.split(os.sep)
+    start = 0
+    while start < len(parts) - 1 and not has_magic(parts[start]):
+        start += 1
+    base = os.sep.join(parts[:start])
+    if not base and start and pathname.startswith(os.sep):
+        base = os.sep
+
+    components = []
+    for i, part in enumerate(parts[start:], start):
+        if not part and i < len(parts) - 1:
+            # as with "a//b", an empty component in the middle is ignored
+            continue
+        if part == RECURSIVE:
+            if components and components[-1] is RECURSIVE:
+                continue
+            components.append(RECURSIVE)
+        elif has_magic(part):
+            components.append(compile_component(part))
+        else:
+            components.append(part)
+    return base, tuple(components)
+
+
+def iglob(pathname, listings):
+    """
+    Yields the paths matching pathname in the same order as
+    glob.iglob(pathname, recursive=True), listing directories through
+    listings. "**" does not descend into symbolic links to directories.
+    """
+    if not has_magic(pathname):
+        dirname, basename = os.path.split(pathname)
+        if basename:
+            if _lexists(pathname):
+                yield pathname
+        elif _isdir(dirname):
+            # patterns ending with a slash only match directories
+            yield pathname
+        return
+    base, components = compile_pattern(pathname)
+    for path in _expand(listings, base, components, 0):
+        # "**" matches the directory it starts in, which is not a match of
+        # the pattern itself when it is the current one
+        if path:
+            yield path
+
+
+def _expand(listings, dirname, components, i):
+    component = components[i]
+    last = i == len(components) - 1
+    # what os.path.join(dirname, name) would prepend to name
+    prefix = dirname if not dirname or dirname.endswith(os.sep) else dirname + os.sep
+
+    if component is RECURSIVE:
+        for d in _walk(listings, dirname, dironly=not last):
+            if last:
+                yield prefix + d
+            else:
+                yield from _expand(listings, prefix + d, components, i + 1)
+        return
+
+    if isinstance(component, str):
+        path = prefix + component
+        if not last:
+            # a directory which does not exist simply lists nothing
+            yield from _expand(listings, path, components, i + 1)
+        elif component:
+            if _lexists(path):
+                yield path
+        elif _isdir(dirname):
+            yield path
+        return
+
+    if last:
+        for name in filter(component, listings.names(dirname)):
+            yield prefix + name
+        return
+    for entry in listings.entries(dirname):
+        if not component(entry.name):
+            continue
+        try:
+            if not entry.is_dir():
+                continue
+        except OSError:
+            continue
+        yield from _expand(listings, prefix + entry.name, components, i + 1)
+
+
+# a path checked without listing the directory holding it is reported as
+# read, so the substitution cache notices when it comes or goes
+def _lexists(path):
+    note_read(path)
+    return os.path.lexists(path)
+
+
+def _isdir(path):
+    note_read(path)
+    return os.path.isdir(path)
+
+
+def _walk(listings, dirname, dironly):
+    """
+    Yields "" for dirname itself, then the paths relative to it of the
+    entries below it, each directory followed by its own entries, leaving
+    out hidden ones
+    """
+    yield ""
+    yield from _walk_below(listings, dirname, dironly)
+
+
+def _walk_below(listings, dirname, dironly):
+    for entry in listings.entries(dirname):
+        name = entry.name
+        if name[0] == ".":
+            continue
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if dironly and not (is_dir or entry.is_dir()):
+                continue
+        except OSError:
+            continue
+        yield name
+        if is_dir:
+            path = os.path.join(dirname, name)
+            for below in _walk_below(listings, path, dironly):
+                yield name + os.sep + below
@@ -0,0 +1,199 @@
+"""
+    this is a line batch module
+    to pass lines between applications as bytes rather than str
+"""
+
+from array import array
+from itertools import accumulate, chain
+
+ENCODING = "utf-8"
+# undecodable bytes survive a round trip through str
+ERRORS = "surrogateescape"
+CHUNK_SIZE = 1 << 16
+
+
+class LineBatch:
+    """
+    A chunk of lines kept as one bytes-like buffer and an array of offsets:
+    line i is buffer[offsets[i]:offsets[i + 1]], trailing newline included.
+    Lines are handed out as memoryview slices of the buffer, so they are
+    only copied or decoded by the applications that really need to.
+    """
+
+    __slots__ = ("buffer", "offsets")
+
+    def __init__(self, buffer, offsets):
+        self.buffer = memoryview(buffer)
+        self.offsets = offsets
+
+    @classmethod
+    def from_bytes(cls, data, end=None):
+        """
+        :param data: bytes-like object holding whole lines
+        :keyword end: only data[:end] is split into lines
+        """
+        end = len(data) if end is None else end
+        pieces = (data if end == len(data) else data[:end]).split(b"\n")
+        offsets = array("Q", [0])
+        offsets.extend(accumulate(len(piece) + 1 for piece in pieces))
+        # the last piece has no newline after it, and is empty if data[:end]
+        # ends with one
+        offsets[-1] = end
+        if not pieces[-1]:
+            offsets.pop()
+        return cls(data, offsets)
+
+    @classmethod
+    def from_buffer(cls, buffer, start, end):
+        """
+        :param buffer: bytes-like object, such as a memory map, which the
+                       batch refers to instead of copying
+        :returns: the batch of lines in buffer[start:end]
+        """
+        # splitting a throwaway copy is faster than searching the buffer
+        # for newlines one at a time
+        pieces = bytes(buffer[start:end]).split(b"\n")
+        offsets = array("Q", accumulate(chain([start], (len(p) + 1 for p in pieces))))
+        offsets[-1] = end
+        if not pieces[-1]:
+            offsets.pop()
+        return cls(buffer, offsets)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        :param lines: list of bytes-like lines, copied once into a new buffer
+        """
+        offsets = array("Q", [0])
+        offsets.extend(accumulate(map(len, lines)))
+        return cls(b"".join(lines), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        buffer, offsets = self.buffer, self.offsets
+        for i in range(len(offsets) - 1):
+            yield buffer[offsets[i] : offsets[i + 1]]
+
+    def line(self, i):
+        return self.buffer[self.offsets[i] : self.offsets[i + 1]]
+
+    def slice(self, start, stop=None):
+        """
+        :returns: a batch of lines start to stop sharing this buffer
+        """
+        stop = len(self) if stop is None else stop
+        return LineBatch(self.buffer, self.offsets[start : stop + 1])
+
+    def view(self):
+        """
+        :returns: a memoryview of all the lines of this batch
+        """
+        return self.buffer[self.offsets[0] : self.offsets[-1]]
+
+    def split(self):
+        """
+        :returns: list of the lines as bytes without their newlines, which
+                  are cheaper to slice and compare than memoryviews
+        """
+        lines = bytes(self.view()).split(b"\n")
+        if not lines[-1]:
+            lines.pop()
+        return lines
+
+    def decode(self):
+        return [decode(line) for line in self]
+
+
+def encode(text):
+    return text.encode(ENCODING, ERRORS)
+
+
+def decode(data):
+    return str(data, ENCODING, ERRORS)
+
+
+def iter_batches(stdin):
+    """
+    :param stdin: iterable of str chunks, bytes chunks and LineBatches
+    :returns: iterator of LineBatches
+    """
+    for item in stdin:
+        if isinstance(item, LineBatch):
+            yield item
+        elif isinstance(item, str):
+            yield LineBatch.from_bytes(encode(item))
+        else:
+            yield LineBatch.from_bytes(item)
+
+
+def iter_lines(stdin):
+    """
+    :param stdin: iterable of str chunks, bytes chunks and LineBatches
+    :returns: iterator of str, where every batch is decoded line by line
+    """
+    for item in stdin:
+        if isinstance(item, LineBatch):
+            yield from item.decode()
+        elif isinstance(item, str):
+            yield item
+        else:
+            yield decode(item)
+
+
+def iter_bytes(stdin):
+    """
+    :param stdin: iterable of str chunks, bytes chunks and LineBatches
+    :returns: iterator of bytes-like chunks, ready for a binary file
+    """
+    for item in stdin:
+        if isinstance(item, LineBatch):
+            yield item.view()
+        elif isinstance(item, str):
+            yield encode(item)
+        else:
+            yield item
+
+
+def close_stream(stream):
+    """
+    Tells whatever produces stream that nothing more will be read from it,
+    so generators run their finally blocks and LocalApp processes are killed
+    """
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+def concat(streams):
+    """
+    Like itertools.chain.from_iterable over a list of streams, except that
+    closing it closes all of them, including those not started yet
+    """
+    try:
+        for stream in streams:
+            yield from stream
+    finally:
+        for stream in streams:
+            close_stream(stream)
+
+
+def read_batches(f, size=CHUNK_SIZE):
+    """
+    Reads a binary file object chunk by chunk. Each batch ends after the
+    last newline of its chunk, the rest is carried over to the next one.
+    """
+    rest = b""
+    while True:
+        chunk = f.read1(size)
+        if not chunk:
+            break
+        if rest:
+            chunk = rest + chunk
+        end = chunk.rfind(b"\n") + 1
+        rest = chunk[end:]
+        if end:
+            yield LineBatch.from_bytes(chunk, end)
+    if rest:
+        yield LineBatch.from_bytes(rest)
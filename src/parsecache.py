@@ -0,0 +1,133 @@
+"""
+    this is a parse cache module
+    to reuse the ASTs of command lines that have been parsed before
+"""
+
+from collections import OrderedDict, namedtuple
+import os
+import pickle
+import tempfile
+import threading
+
+import descentparser
+from parsercombinator import command
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class ParseCache:
+    """
+    Least recently used cache from command text to its AST. The ASTs are
+    shared by every evaluation of the same text, so visitors must not
+    modify them. Text that fails to parse is not cached, so its error is
+    raised again every time.
+    When FILE is set, the cache is read from it on first use and written
+    back after new entries are added, so that a new shell starts warm.
+    """
+
+    VERSION = 2
+    MAXSIZE = int(os.environ.get("COMP0010_PARSE_CACHE_SIZE", 1024))
+    FILE = os.environ.get("COMP0010_PARSE_CACHE") or None
+
+    def __init__(self, parser, maxsize=None, file=None):
+        self.parser = parser
+        self.maxsize = self.MAXSIZE if maxsize is None else maxsize
+        self.file = self.FILE if file is None else file
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._loaded = self.file is None
+        self._dirty = False
+        # substitutions may be parsed by the threads of a concurrent pipeline
+        self._lock = threading.Lock()
+
+    def parse(self, text):
+        """
+        :returns: AST of text, parsed only if it is not in the cache
+        """
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            ast = self._entries.get(text)
+            if ast is not None:
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return ast
+            self.misses += 1
+        ast = self.parser(text)
+        with self._lock:
+            self._entries[text] = ast
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return ast
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def load(self):
+        """
+        Adds the entries saved in file, less recently used than those
+        already in the cache
+        """
+        self._loaded = True
+        try:
+            with open(self.file, "rb") as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            # a missing, damaged or outdated cache is simply built again
+            return
+        if version != self.VERSION:
+            return
+        with self._lock:
+            for text, ast in reversed(entries):
+                if len(self._entries) >= self.maxsize:
+                    break
+                if text not in self._entries:
+                    self._entries[text] = ast
+                    self._entries.move_to_end(text, last=False)
+
+    def save(self):
+        """
+        Writes the cache to file, if it has one and has new entries
+        """
+        if self.file is None or not self._dirty:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.file))
+        os.makedirs(directory, exist_ok=True)
+        # write a new file and rename it over the old one, so concurrent
+        # shells never read half a cache
+        fd, temp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self.VERSION, entries), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self.file)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+
+PARSERS = {"parsy": command.parse, "descent": descentparser.parse}
+
+
+def get_parser():
+    # COMP0010_PARSER=descent parses with the hand-written parser
+    return PARSERS.get(os.environ.get("COMP0010_PARSER"), command.parse)
+
+
+parse_cache = ParseCache(get_parser())
+
+
+def parse(text):
+    """
+    :returns: AST of the command line text, from parse_cache
+    """
+    return parse_cache.parse(text)
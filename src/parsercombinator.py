@@ -1,3 +1,5 @@
+from sys import intern
+
 from parsy import generate, regex, seq, string
 
 import abstract_syntax_tree
@@ -10,7 +12,7 @@ nonKeyWord = regex("[^`\"'\\s;|\n]+").desc("not keyword string")
 @generate
 def singleQuoted():
     content = yield regex("'[^'\n]*'")
-    return abstract_syntax_tree.SingleQuote(content[1:-1])
+    return abstract_syntax_tree.SingleQuote(intern(content[1:-1]))
 
 
 @generate
@@ -22,7 +24,8 @@ def backQuoted():
 @generate
 def doubleQuoted():
     yield string('"')
-    middle = yield (backQuoted | regex('[^\n`"]')).many()
+    # runs of characters are read whole, not one character at a time
+    middle = yield (backQuoted | regex('[^\n`"]+').map(intern)).many()
     yield string('"')
 
     # This shows if there is any substitutble parts in this quote
@@ -49,7 +52,7 @@ greaterThan = string(">")
 @generate
 def unquoted():
     s = yield regex("[^\\s\\t'\"`\n;|<>]+")
-    return s
+    return intern(s)
 
 
 argument = (quoted | unquoted).at_least(1)
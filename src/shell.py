@@ -1,28 +1,47 @@
 import sys
 import os
-from parsercombinator import command
-from visitor import ASTVisitor
+from compiler import concurrent_plan_cache, plan_cache
+from parsecache import parse_cache
+from linebatch import iter_bytes, iter_lines
 import traceback
 from parsy import ParseError
 
 
+# write lines as they are produced rather than joining them first
+def write(stdout):
+    binary = getattr(sys.stdout, "buffer", None)
+    if binary is None:
+        sys.stdout.writelines(iter_lines(stdout))
+    else:
+        # bytes go straight to the binary layer, so binary files survive cat
+        sys.stdout.flush()
+        binary.writelines(iter_bytes(stdout))
+        binary.flush()
+
+
+def get_plans():
+    # COMP0010_PIPES=concurrent runs each pipeline stage in its own thread
+    if os.environ.get("COMP0010_PIPES") == "concurrent":
+        return concurrent_plan_cache
+    return plan_cache
+
+
 def eval(cmdline):
-    visitor = ASTVisitor()
     try:
-        cmd = command.parse(cmdline)
+        plan = get_plans().parse(cmdline)
     except ParseError:
         print(traceback.format_exc(), file=sys.stderr)
         return
 
     try:
-        out = cmd.accept(visitor)
+        out = plan()
+        write(out["stdout"])
         if out["exit_code"]:
-            print("".join(out["stdout"]), end="")
             print("".join(out["stderr"]), end="")
-        else:
-            print("".join(out["stdout"]), end="")
     except Exception:
         print(traceback.format_exc(), file=sys.stderr)
+    finally:
+        parse_cache.save()
 
 
 def handle_arg_case(args=[]):
@@ -0,0 +1,185 @@
+"""
+    this is a substitution cache module
+    to reuse the output of substituted commands whose inputs have not changed
+"""
+
+from collections import OrderedDict, deque
+import os
+import sys
+import threading
+import time
+from abstract_syntax_tree import Call, DoubleQuote, Pipe, RedirectOut, Seq, Substitution
+from appsFactory import AppsFactory
+from filesource import READ_EVENT
+from parsecache import CacheInfo, parse
+
+# opens with any of these flags write rather than read, e.g. the temporary
+# files of sort, and are not inputs of the command
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT
+
+
+class SubstitutionCache:
+    """
+    Least recently used cache from the text of a substituted command and
+    the current directory to the result of visit_sub. While a command
+    runs, an audit hook records the files it opens and the directories
+    it lists; an entry is used again only while their mtimes are those
+    seen when it was stored.
+    Only commands whose applications are all PURE, with no output
+    redirections, are cached, and only when COMP0010_SUB_CACHE sets the
+    number of entries.
+    """
+
+    MAXSIZE = int(os.environ.get("COMP0010_SUB_CACHE") or 0)
+    # an input modified this recently may change again within the same
+    # mtime tick, so a result read from it is not stored
+    SETTLE_NS = 2 * 10**9
+
+    def __init__(self, maxsize=None):
+        self.maxsize = self.MAXSIZE if maxsize is None else maxsize
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # sets of the paths read by the commands being recorded, in every
+        # thread, as pipeline stages may read in threads of their own
+        self._recorders = {}
+        self._hooked = False
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def eligible(self, ast):
+        """
+        :returns: whether the result of running ast may be cached
+        """
+        if isinstance(ast, (Seq, Pipe)):
+            return self.eligible(ast.left) and self.eligible(ast.right)
+        if not isinstance(ast, Call) or not isinstance(ast.appName, str):
+            return False
+        if any(isinstance(r, RedirectOut) for r in ast.redirects):
+            return False
+        name = ast.appName[1:] if ast.appName.startswith("_") else ast.appName
+        app = AppsFactory().menu.get(name)
+        if app is None or not app.PURE:
+            return False
+        return all(self._eligible_part(part) for arg in ast.args for part in arg)
+
+    def _eligible_part(self, part):
+        if isinstance(part, Substitution):
+            try:
+                return self.eligible(parse(part.quoted))
+            except Exception:
+                return False
+        if isinstance(part, DoubleQuote):
+            return all(self._eligible_part(p) for p in part.quotedPart)
+        return True
+
+    def run(self, text, evaluate):
+        """
+        :param evaluate: function running the command text, which returns
+                         the result of visit_sub
+        :returns: the result of evaluate, from the cache if its inputs have
+                  not changed
+        """
+        key = (text, os.getcwd())
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._unchanged(entry[1]):
+            with self._lock:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # a substitution recorded around this one depends on the
+                # same inputs, though they are not read again
+                for paths in self._recorders.values():
+                    paths.update(path for path, _ in entry[1])
+            return self._result(entry[0])
+
+        with self._lock:
+            self.misses += 1
+        paths = self._record()
+        try:
+            executed = evaluate()
+            result = (
+                "".join(executed["stdout"]),
+                list(executed["stderr"]),
+                executed["exit_code"],
+            )
+        finally:
+            with self._lock:
+                del self._recorders[id(paths)]
+                paths = tuple(paths)
+
+        inputs = tuple((path, self._mtime(path)) for path in paths)
+        settled = time.time_ns() - self.SETTLE_NS
+        if all(mtime is None or mtime < settled for _, mtime in inputs):
+            with self._lock:
+                self._entries[key] = (result, inputs)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return self._result(result)
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def _record(self):
+        # audit hooks cannot be removed, so the hook is only added once
+        # the cache is used
+        if not self._hooked:
+            with self._lock:
+                if not self._hooked:
+                    sys.addaudithook(self._audit)
+                    self._hooked = True
+        paths = set()
+        with self._lock:
+            self._recorders[id(paths)] = paths
+        return paths
+
+    def _audit(self, event, args):
+        if not self._recorders:
+            return
+        if event == "open":
+            path, _, flags = args
+            if not isinstance(path, (str, bytes)) or flags & WRITE_FLAGS:
+                return
+        elif event in ("os.scandir", "os.listdir", READ_EVENT):
+            path = args[0]
+            if path is None:
+                path = "."
+            elif not isinstance(path, (str, bytes)):
+                return
+        else:
+            return
+        with self._lock:
+            for paths in self._recorders.values():
+                paths.add(path)
+
+    @classmethod
+    def _unchanged(cls, inputs):
+        return all(cls._mtime(path) == mtime for path, mtime in inputs)
+
+    @classmethod
+    def _mtime(cls, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def _result(cls, result):
+        stdout, stderr, exit_code = result
+        return {
+            "stdout": deque(stdout),
+            "stderr": deque(stderr),
+            "exit_code": exit_code,
+        }
+
+
+sub_cache = SubstitutionCache()
@@ -5,18 +5,28 @@
 
 from abc import ABC, abstractmethod
 from collections import deque
-from glob import glob
-from itertools import product
+from glob import escape, has_magic
+from itertools import chain
+import os
+from queue import Full, Queue
+import threading
+import time
 from abstract_syntax_tree import (
     Call,
     DoubleQuote,
+    Pipe,
     RedirectIn,
     RedirectOut,
     SingleQuote,
     Substitution,
 )
+from apps import ProcessOutput
 from appsFactory import AppsFactory
-from parsercombinator import command
+from filesource import FileInput
+from globbing import Listings, Replay, iglob, product
+from linebatch import close_stream, concat, iter_bytes, iter_lines
+from parsecache import parse
+from subcache import sub_cache
 
 
 class Visitor(ABC):
@@ -59,6 +69,10 @@ class Visitor(ABC):
 
 class ASTVisitor(Visitor):
 
+    # "product" runs an application once for each combination of the
+    # matches of its globs rather than once with all of them
+    GLOB = os.environ.get("COMP0010_GLOB") or "bash"
+
     """
     :param singleQuote: this is a AST().SingleQuote object
     :returns: this is a dictionary of srdout, stderr and exit_code
@@ -116,12 +130,16 @@ class ASTVisitor(Visitor):
     """
 
     def visit_sub(self, sub):
-        ast = command.parse(sub.quoted)
+        ast = parse(sub.quoted)
+        if sub_cache.enabled and sub_cache.eligible(ast):
+            return sub_cache.run(sub.quoted, lambda: self._evaluateSub(ast))
+        return self._evaluateSub(ast)
+
+    def _evaluateSub(self, ast):
         executed = ast.accept(self)
 
-        out = executed["stdout"]
-        assert isinstance(out, deque)
-        out_new = deque("".join(out).strip("\n ").replace("\n", " "))
+        out = "".join(iter_lines(executed["stdout"]))
+        out_new = deque(out.strip("\n ").replace("\n", " "))
 
         return {
             "stdout": out_new,
@@ -139,7 +157,7 @@ class ASTVisitor(Visitor):
 
         out = deque()
 
-        fs = glob(redirectIn.arg)
+        fs = list(iglob(redirectIn.arg, Listings()))
         assert isinstance(fs, list)
 
         if len(fs) < 1:
@@ -160,15 +178,7 @@ class ASTVisitor(Visitor):
 
     def visit_redirect_out(self, redirect_out, stdin=None):
 
-        fs = glob(redirect_out.arg) or [redirect_out.arg]
-        n = len(fs)
-        assert isinstance(fs, list)
-
-        if n > 1:
-            raise Exception("invalid redirection out")
-        assert n <= 1
-
-        stdout_f = fs[0]
+        stdout_f = self._getRedirectOutFile(redirect_out)
         with open(stdout_f, "w") as f:
             while len(stdin) > 0:
                 line = stdin.popleft()
@@ -189,8 +199,6 @@ class ASTVisitor(Visitor):
         args = call.args
 
         factory = AppsFactory()
-        out = deque()
-        err = deque()
 
         # "`echo echo` foo"
         app_name = self._getAppName(app_name)
@@ -210,16 +218,13 @@ class ASTVisitor(Visitor):
         parsed_arg, glob_index, globbed_result = self._getArgs(args)
 
         if len(glob_index) > 0:
-            final_args_lst = self._getGlobbedArg(parsed_arg, glob_index, globbed_result)
+            final_args_lst = self._getGlobbedArg(
+                parsed_arg, glob_index, globbed_result, app.ARG_MAX
+            )
         else:
             final_args_lst = [parsed_arg]
 
-        for final_args in final_args_lst:
-            executed = app.exec(final_args, stdin=stdin)
-            out.extend(executed["stdout"])
-            err.extend(executed["stderr"])
-        assert isinstance(out, deque)
-        assert isinstance(err, deque)
+        out, err = self._execute(app, final_args_lst, stdin)
 
         if redirect_out:
             redirect_out.accept(self, stdin=out)
@@ -281,18 +286,26 @@ class ASTVisitor(Visitor):
         globbed_result = []
         parsed_arg = []
         glob_index = []
+        # globs are expanded lazily, each directory is listed once for all
+        listings = Listings()
 
         for n, arg in enumerate(args):
 
             # arg: []
             arg_out = deque()
+            pattern = deque()
             for sub_arg in arg:
                 arg_out_new, glob_index = self._getSubArg(sub_arg, glob_index, n)
                 arg_out.extend(arg_out_new)
+                # only unquoted parts are patterns, the rest match literally
+                if isinstance(sub_arg, str):
+                    pattern.append(sub_arg)
+                else:
+                    pattern.append(escape("".join(arg_out_new)))
 
             parsed_arg.append("".join(arg_out))
             if n in glob_index:
-                globbed_result.append(glob(parsed_arg[-1]))
+                globbed_result.append(Replay(iglob("".join(pattern), listings)))
 
         return (parsed_arg, glob_index, globbed_result)
 
@@ -306,8 +319,8 @@ class ASTVisitor(Visitor):
                 raise Exception(executed_process["stderr"])
             arg_out.append("".join(executed_process["stdout"]))
 
-        # ['a','*.py']
-        elif isinstance(sub_arg, str) and "*" in sub_arg:
+        # ['a','*.py'], ['**/*.py'], ['file?.txt'], ['[ab].txt']
+        elif isinstance(sub_arg, str) and has_magic(sub_arg):
             glob_index.append(n)
             arg_out.append(sub_arg)
 
@@ -328,6 +341,19 @@ class ASTVisitor(Visitor):
 
         return app_name
 
+    def _execute(self, app, final_args_lst, stdin):
+        out = deque()
+        err = deque()
+
+        for final_args in final_args_lst:
+            executed = app.exec(final_args, stdin=stdin)
+            out.extend(executed["stdout"])
+            err.extend(executed["stderr"])
+        assert isinstance(out, deque)
+        assert isinstance(err, deque)
+
+        return (out, err)
+
     def _getRedirects(self, redirects):
 
         stdin, redirect_out = None, None
@@ -343,9 +369,69 @@ class ASTVisitor(Visitor):
 
         return (stdin, redirect_out)
 
-    def _getGlobbedArg(self, parsedArg, glob_index, globbed_result):
+    def _getRedirectOutFile(self, redirect_out):
+
+        fs = list(iglob(redirect_out.arg, Listings())) or [redirect_out.arg]
+        n = len(fs)
+        assert isinstance(fs, list)
+
+        if n > 1:
+            raise Exception("invalid redirection out")
+        assert n <= 1
+
+        return fs[0]
+
+    def _getGlobbedArg(self, parsedArg, glob_index, globbed_result, arg_max=None):
+        if self.GLOB == "product":
+            return self._getGlobProduct(parsedArg, glob_index, globbed_result)
+        return self._getGlobExpansion(parsedArg, glob_index, globbed_result, arg_max)
+
+    # every match of a glob is an argument of the same run, and a glob
+    # without matches is left as it is, as in bash. Matches past arg_max
+    # bytes are split between runs, like xargs does, each of them with
+    # all the other arguments.
+    def _getGlobExpansion(self, parsedArg, glob_index, globbed_result, arg_max):
+
+        args = []
+        matches = iter(globbed_result)
+        for arg_index, arg in enumerate(parsedArg):
+            found = list(next(matches)) if arg_index in glob_index else None
+            if found:
+                args.extend((match, True) for match in found)
+            else:
+                args.append((arg, False))
+
+        if arg_max is None:
+            return [[arg for arg, _ in args]]
+
+        budget = arg_max - sum(self._argSize(arg) for arg, match in args if not match)
+        positions = [i for i, (_, match) in enumerate(args) if match]
+        batches, start, size = [], 0, 0
+        for k, i in enumerate(positions):
+            arg_size = self._argSize(args[i][0])
+            if size + arg_size > budget and k > start:
+                batches.append(positions[start:k])
+                start, size = k, 0
+            size += arg_size
+        batches.append(positions[start:])
 
         args_lst = []
+        for batch in batches:
+            batch = set(batch)
+            args_lst.append(
+                [arg for i, (arg, match) in enumerate(args) if not match or i in batch]
+            )
+        return args_lst
+
+    @classmethod
+    def _argSize(cls, arg):
+        # the bytes, the terminating null and the pointer to the argument
+        return len(os.fsencode(arg)) + 9
+
+    # yields the argument lists as the globs are expanded, so the first
+    # run does not wait for the expansion to finish
+    def _getGlobProduct(self, parsedArg, glob_index, globbed_result):
+
         glob_pairs = product(*globbed_result)
 
         for pair in glob_pairs:
@@ -360,6 +446,257 @@ class ASTVisitor(Visitor):
                 else:
                     args_for_this_pair.append(parsedArg[arg_index])
 
-            args_lst.append(args_for_this_pair)
+            yield args_for_this_pair
 
-        return args_lst
+
+class StreamingASTVisitor(ASTVisitor):
+
+    """
+    Evaluates calls, pipes and redirections over lazy iterators of lines
+    instead of deques, so a pipeline only holds the lines in flight and
+    its peak memory does not grow with the size of the input. Lines are
+    passed around as str or as LineBatches of undecoded bytes.
+    """
+
+    def visit_redirect_in(self, redirectIn):
+        assert isinstance(redirectIn, RedirectIn)
+
+        fs = list(iglob(redirectIn.arg, Listings()))
+        assert isinstance(fs, list)
+
+        if len(fs) < 1:
+            raise FileNotFoundError
+        assert len(fs) >= 1
+
+        return {"stdout": self._readFiles(fs), "stderr": deque(), "exit_code": 0}
+
+    def visit_redirect_out(self, redirect_out, stdin=None):
+
+        stdout_f = self._getRedirectOutFile(redirect_out)
+        with open(stdout_f, "wb") as f:
+            self._writeOut(f, stdin)
+
+    """
+    :param seq: this is a AST().Seq object
+    :returns: this is a dictionary of srdout, stderr and exit_code
+    """
+
+    def visit_seq(self, seq):
+        left = seq.left
+        right = seq.right
+
+        # the left command has to finish before the right one starts,
+        # e.g. "ls; cd dir; ls" must not list dir twice
+        out_left = left.accept(self)
+        stdout_left = deque(out_left["stdout"])
+        out_right = right.accept(self)
+
+        stderr = deque(out_left["stderr"])
+        stderr.extend(out_right["stderr"])
+
+        return {
+            "stdout": chain(stdout_left, out_right["stdout"]),
+            "stderr": stderr,
+            "exit_code": out_left["exit_code"] or out_right["exit_code"],
+        }
+
+    """
+    :param pipe: this is a AST().Pipe object
+    :returns: this is a dictionary of srdout, stderr and exit_code
+    """
+
+    def visit_pipe(self, pipe):
+        stages = self._getStages(pipe)
+
+        executed = stages[0].accept(self)
+        outs = [executed["stdout"]]
+        stderr = deque(executed["stderr"])
+        exit_code = executed["exit_code"]
+
+        for stage in stages[1:]:
+            executed = stage.accept(self, input=self._connect(executed["stdout"]))
+            outs.append(executed["stdout"])
+            stderr.extend(executed["stderr"])
+            exit_code = exit_code or executed["exit_code"]
+
+        return {
+            "stdout": self._waitUnread(outs[-1], outs[:-1]),
+            "stderr": stderr,
+            "exit_code": exit_code,
+        }
+
+    # each stage reads the one before it lazily, as it is
+    @classmethod
+    def _connect(cls, stdout):
+        return stdout
+
+    # "a | b | c" is parsed as Pipe(Pipe(a, b), c)
+    @classmethod
+    def _getStages(cls, pipe):
+        stages = deque()
+        while isinstance(pipe, Pipe):
+            stages.appendleft(pipe.right)
+            pipe = pipe.left
+        stages.appendleft(pipe)
+        return list(stages)
+
+    @classmethod
+    def _waitUnread(cls, stdout, upstreams):
+        """
+        :param upstreams: outputs of the stages of a pipeline before the last
+        :returns: stdout of the last stage, after which the processes of
+                  the stages whose output nothing has read are waited for,
+                  as a shell waits for every command of a pipeline
+        """
+        unread = [out for out in upstreams if isinstance(out, ProcessOutput)]
+        unread = [out for out in unread if out.unread]
+        if not unread:
+            return stdout
+        return cls._thenWait(stdout, unread)
+
+    @classmethod
+    def _thenWait(cls, stdout, processes):
+        try:
+            yield from stdout
+        finally:
+            for process in processes:
+                process.wait()
+
+    def _execute(self, app, final_args_lst, stdin):
+        outs = []
+        err = deque()
+        runs = iter(final_args_lst)
+
+        # the first run starts at once, so its errors are raised before
+        # any output. Errors that are not raised are counted in the exit
+        # code, so every run of such an application starts at once too;
+        # otherwise a run starts when the output reaches it.
+        for final_args in runs:
+            executed = app.stream(final_args, stdin=stdin)
+            outs.append(executed["stdout"])
+            err.extend(executed["stderr"])
+            if app.RAISES:
+                break
+
+        # the output of a single run is handed on as it is, so that a
+        # LocalApp reading a process can connect to it with an OS pipe
+        if len(outs) == 1 and isinstance(final_args_lst, list):
+            if len(final_args_lst) == 1:
+                return (outs[0], err)
+        return (self._concatRuns(app, outs, runs, stdin), err)
+
+    @classmethod
+    def _concatRuns(cls, app, outs, runs, stdin):
+        yield from concat(outs)
+        for final_args in runs:
+            stdout = app.stream(final_args, stdin=stdin)["stdout"]
+            try:
+                yield from stdout
+            finally:
+                close_stream(stdout)
+
+    @classmethod
+    def _readFiles(cls, fs):
+        return FileInput(fs)
+
+    # the output of a process is copied as it is, without splitting lines
+    @classmethod
+    def _writeOut(cls, f, stdin):
+        if isinstance(stdin, ProcessOutput) and stdin.unread:
+            stdin.write_to(f)
+        else:
+            f.writelines(iter_bytes(stdin))
+
+
+class ConcurrentASTVisitor(StreamingASTVisitor):
+
+    """
+    Runs every stage of a pipeline "a | b | c" in its own worker thread,
+    connected by bounded queues, so a slow stage no longer stalls the
+    stages around it and LocalApp processes work in parallel.
+    """
+
+    # processes run on their own from the start, and a LocalApp reading
+    # another takes the pipe of its process over, so they are not put in a
+    # channel; those nothing reads are waited for at the end of the pipeline
+    @classmethod
+    def _connect(cls, stdout):
+        if isinstance(stdout, ProcessOutput):
+            return stdout
+        return _Channel(stdout)
+
+
+class _Channel:
+    """
+    Bounded queue filled from an iterator of lines by a worker thread.
+    Lines travel in batches to keep locking off the per-line path, and a
+    batch is flushed after FLUSH_INTERVAL seconds so slow producers are
+    not held back until a full batch has accumulated.
+    """
+
+    QUEUE_SIZE = 64
+    BATCH_SIZE = 256
+    FLUSH_INTERVAL = 0.01
+
+    _DONE = object()
+
+    def __init__(self, source):
+        self._queue = Queue(maxsize=self.QUEUE_SIZE)
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._pump, args=(source,))
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield from item
+        finally:
+            self._stopped.set()
+
+    def close(self):
+        """
+        Stops the worker, which then closes the stage feeding the channel
+        """
+        self._stopped.set()
+
+    def _pump(self, source):
+        try:
+            self._pumpBatches(source)
+        finally:
+            close_stream(source)
+
+    def _pumpBatches(self, source):
+        batch = []
+        flushed = time.monotonic()
+        try:
+            for line in source:
+                batch.append(line)
+                now = time.monotonic()
+                if len(batch) >= self.BATCH_SIZE or now - flushed >= self.FLUSH_INTERVAL:
+                    if not self._put(batch):
+                        return
+                    batch = []
+                    flushed = now
+        except Exception as e:
+            if batch:
+                self._put(batch)
+            self._put(e)
+            return
+        if batch:
+            self._put(batch)
+        self._put(self._DONE)
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
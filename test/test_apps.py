@@ -1,4 +1,11 @@
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import shutil
+import subprocess
+import sys
+import tempfile
+import itertools
 import unittest
 import mock
 from apps import (
@@ -15,7 +22,14 @@ from apps import (
     Sort,
     Uniq,
     LocalApp,
+    Updatedb,
+    Hash,
+    compile_pattern,
 )
+from commandhash import CommandHash
+from findindex import FindIndex
+from filesource import FileInput, FileSource
+from linebatch import LineBatch, encode, iter_lines
 import os
 from hypothesis import given
 from hypothesis import strategies as st
@@ -57,6 +71,42 @@ class TestApps(unittest.TestCase):
         stderr = output["stderr"]
         assert stderr == f"Ls: {args[0]}: No such directory"
 
+    def test_ls_long(self):
+        os.symlink("file1.txt", "link")
+        try:
+            stdout = list(Ls().exec(["-l", "--sort"])["stdout"])
+        finally:
+            os.remove("link")
+        assert [line.split()[0][0] for line in stdout] == ["-", "-", "d", "l"]
+        assert stdout[0].split()[4] == "15"
+        assert stdout[0].endswith(" file1.txt\n")
+        assert stdout[3].endswith(" link -> file1.txt\n")
+
+    def test_ls_sort(self):
+        names = [f"f{i}" for i in range(50)]
+        for name in names:
+            open(name, "w").close()
+        try:
+            with mock.patch.object(Sort, "BUFFER_SIZE", 200):
+                stdout = list(Ls().exec(["--sort", "."])["stdout"])
+            with mock.patch.object(Ls, "STAT_BATCH", 3):
+                long = list(Ls().exec(["--sort", "-l"])["stdout"])
+        finally:
+            for name in names:
+                os.remove(name)
+        expected = sorted(["find", "file1.txt", "file2.txt"] + names)
+        assert stdout == [name + "\n" for name in expected]
+        assert [line.split()[-1] for line in long] == expected
+
+    def test_ls_long_stops_early(self):
+        names = iter(["file1.txt"] * 100)
+        with mock.patch.object(Ls, "STAT_BATCH", 1):
+            output = Ls.long_helper(".", names)
+            assert next(output).endswith(" file1.txt\n")
+            output.close()
+        # the batches not looked up yet are left unread
+        assert len(list(names)) > 0
+
     def test_cat_args(self):
         args = ["file1.txt"]
         output = Cat().exec(args=args)
@@ -64,6 +114,11 @@ class TestApps(unittest.TestCase):
 
         assert stdout == "abc\nadc\nabc\ndef"
 
+    def test_cat_args_lazy_stdin(self):
+        # a stage before cat hands it a generator even when it prints nothing
+        output = Cat().exec(args=["file1.txt"], stdin=(line for line in []))
+        assert list(output["stdout"]) == ["abc\nadc\nabc\ndef"]
+
     def test_cat_wrong_args(self):
         args = ["file3.txt"]
         output = Cat().exec(args=args)
@@ -151,6 +206,37 @@ class TestApps(unittest.TestCase):
 
         assert list(stdout) == ["abc\n", "adc\n", "abc\n", "def"]
 
+    def test_head_bytes(self):
+        output = Head().exec(args=["-c", "6", "file1.txt"])
+        assert list(output["stdout"]) == ["abc\n", "ad"]
+
+        output = Head().exec(args=["-c", "100", "file1.txt"])
+        assert list(output["stdout"]) == ["abc\n", "adc\n", "abc\n", "def"]
+
+        stdin = deque(["abc\n", "adc\n"])
+        output = Head().exec(args=["-c", "5"], stdin=stdin)
+        assert list(output["stdout"]) == ["abc\n", "a"]
+
+        output = Head().exec(args=["-c", "0", "file1.txt"])
+        assert list(output["stdout"]) == []
+
+        output = Head().exec(args=["-c", "2", "file3.txt"])
+        assert output["stderr"] == "Head: file3.txt: No such file or directory"
+
+    def test_head_closes_upstream(self):
+        closed = []
+
+        def upstream():
+            try:
+                while True:
+                    yield "line\n"
+            finally:
+                closed.append(True)
+
+        output = Head().stream(args=["-c", "3"], stdin=upstream())
+        assert list(iter_lines(output["stdout"])) == ["lin"]
+        assert closed == [True]
+
     def test_tail(self):
         args = ["-i", "2", "file1.txt"]
         output = Tail().exec(args=args)
@@ -198,6 +284,23 @@ class TestApps(unittest.TestCase):
 
         assert list(stdout) == ["abc\n", "adc\n", "abc\n", "def"]
 
+    @given(
+        text=st.text(alphabet="ab\n", max_size=40),
+        num_lines=st.integers(min_value=0, max_value=12),
+    )
+    def test_tail_seek(self, text, num_lines):
+        with open("file3.txt", "w") as f:
+            f.write(text)
+        lines = text.splitlines(keepends=True)
+        expected = lines[len(lines) - min(num_lines, len(lines)) :]
+        with mock.patch.object(Tail, "BLOCK_SIZE", 3):
+            output = Tail().exec(args=["-n", str(num_lines), "file3.txt"])
+        os.remove("file3.txt")
+        assert list(output["stdout"]) == expected
+
+        output = Tail().exec(args=["-n", str(num_lines)], stdin=deque(lines))
+        assert list(output["stdout"]) == expected
+
     def test_Grep(self):
         args = []
         output = Grep().exec(args=args)
@@ -233,6 +336,113 @@ class TestApps(unittest.TestCase):
 
         assert list(stdout) == []
 
+    def test_grep_count(self):
+        output = Grep().exec(args=["-c", "a", "file1.txt", "file2.txt"])
+        assert list(output["stdout"]) == ["file1.txt:3\n", "file2.txt:0\n"]
+
+        stdin = deque(["abc\n", "def\n"])
+        output = Grep().exec(args=["-c", "d"], stdin=stdin)
+        assert list(output["stdout"]) == ["1\n"]
+
+    def test_grep_list(self):
+        output = Grep().exec(args=["-l", "c", "file1.txt", "file2.txt"])
+        assert list(output["stdout"]) == ["file2.txt\n"]
+
+        closed = []
+
+        def upstream():
+            try:
+                while True:
+                    yield "abc\n"
+            finally:
+                closed.append(True)
+
+        output = Grep().stream(args=["-l", "a"], stdin=upstream())
+        assert list(iter_lines(output["stdout"])) == ["(standard input)\n"]
+        assert closed == [True]
+
+    def test_grep_files_lazily(self):
+        with mock.patch.object(Grep, "file_helper", wraps=Grep.file_helper) as opened:
+            stdout = Grep().stream(args=["a", "file1.txt", "file2.txt"])["stdout"]
+            assert next(iter_lines([next(stdout)])) == "file1.txt:abc\n"
+            # the second file is only opened once the first is done
+            assert opened.call_count == 1
+            list(stdout)
+            assert opened.call_count == 2
+
+    def test_grep_parallel(self):
+        files = ["file1.txt", "file2.txt", "file1.txt"]
+        output = Grep.parallel_helper("a", files, None)
+        assert list(iter_lines(output)) == [
+            "file1.txt:abc\n",
+            "file1.txt:adc\n",
+            "file1.txt:abc\n",
+            "file1.txt:abc\n",
+            "file1.txt:adc\n",
+            "file1.txt:abc\n",
+        ]
+        output = Grep.parallel_helper("f", files, "-c")
+        assert list(iter_lines(output)) == ["file1.txt:0\n", "file2.txt:1\n", "file1.txt:0\n"]
+
+    def test_grep_non_ascii(self):
+        lines = ["café\n", "naïve\n", "CAFE\n", "caf\n"]
+        for pattern, expected in [
+            ("caf.$", ["café\n"]),
+            ("na[ïi]ve", ["naïve\n"]),
+            ("(?i)CAFÉ", ["café\n"]),
+            ("caf\\u00e9", ["café\n"]),
+            ("^[a-z]+$", ["caf\n"]),
+            ("(?i)^caf.$", ["café\n", "CAFE\n"]),
+        ]:
+            output = Grep().exec(args=[pattern], stdin=deque(lines))
+            assert list(output["stdout"]) == expected, pattern
+
+    def test_grep_parallel_stops_early(self):
+        # in a process of its own, which would hang on exit, or when the
+        # results are closed, if the pool was not shut down cleanly
+        script = "\n".join(
+            [
+                "from apps import Grep",
+                "from linebatch import iter_lines",
+                "for _ in range(5):",
+                "    output = Grep.parallel_helper('a', ['file1.txt'] * 20, None)",
+                "    assert next(iter_lines(output)) == 'file1.txt:abc\\n'",
+                "    output.close()",
+            ]
+        )
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=60)
+
+    def test_grep_pattern_cache(self):
+        compile_pattern.cache_clear()
+        Grep().exec(args=["a", "file1.txt"])
+        Grep().exec(args=["a", "file2.txt"])
+        assert compile_pattern.cache_info().hits == 1
+
+    @given(
+        line=st.binary(max_size=12).filter(lambda b: b"\n" not in b),
+        ranges=st.lists(
+            st.tuples(st.integers(0, 14), st.integers(0, 14), st.integers(0, 3)),
+            min_size=1,
+            max_size=4,
+        ),
+    )
+    def test_cut_plan(self, line, ranges):
+        specs = []
+        for start, end, kind in ranges:
+            specs.append(
+                [f"{start}", f"{start}-{end}", f"{start}-", f"-{end}"][kind]
+            )
+        positions = set()
+        for start, end, kind in ranges:
+            first = 1 if kind == 3 else start
+            last = start if kind == 0 else len(line) if kind == 2 else end
+            positions.update(range(first, last + 1))
+        expected = bytes(line[i - 1] for i in sorted(positions) if 1 <= i <= len(line))
+
+        plan = Cut.parse_plan(",".join(specs))
+        assert Cut.cut_helper([line], plan) == [expected + b"\n"]
+
     def test_Cut(self):
         args = []
         output = Cut().exec(args=args)
@@ -324,6 +534,40 @@ class TestApps(unittest.TestCase):
         stdout = output["stdout"]
         assert list(stdout) == ["abc\n", "adc\n"]
 
+    def test_uniq_count(self):
+        stdin = deque(["a\n", "a\n", "b\n", "a\n", "a"])
+        output = Uniq().exec(args=["-c"], stdin=stdin)
+        assert list(output["stdout"]) == ["      2 a\n", "      1 b\n", "      1 a\n", "      1 a"]
+
+        output = Uniq().exec(args=["--global", "-c"], stdin=stdin)
+        assert list(output["stdout"]) == ["      3 a\n", "      1 b\n", "      1 a"]
+
+        output = Uniq().exec(args=["-i", "--global", "file1.txt"])
+        assert list(output["stdout"]) == ["abc\n", "adc\n", "def"]
+
+    @given(
+        lines=st.lists(st.sampled_from(["a\n", "A\n", "b\n", "c\n", "c"]), max_size=30),
+        ignore=st.booleans(),
+        count=st.booleans(),
+        spill=st.booleans(),
+    )
+    def test_uniq_global(self, lines, ignore, count, spill):
+        counts = {}
+        for line in lines:
+            key = line.casefold() if ignore else line
+            first, n = counts.get(key, (line, 0))
+            counts[key] = (first, n + 1)
+        if count:
+            expected = [f"{n:7d} {line}" for line, n in counts.values()]
+        else:
+            expected = [line for line, _ in counts.values()]
+
+        budget = Uniq.ENTRY_OVERHEAD if spill else Uniq.BUFFER_SIZE
+        with mock.patch.object(Uniq, "BUFFER_SIZE", budget), mock.patch.object(Uniq, "PARTITIONS", 2):
+            batches = [LineBatch.from_lines([encode(line)]) for line in lines]
+            output = Uniq.global_helper(ignore, batches, count)
+            assert list(iter_lines(output)) == expected
+
     def test_Sort(self):
         args = ["-r ", "file1.txt", "file2.txt"]
         output = Sort().exec(args=args)
@@ -404,6 +648,230 @@ class TestApps(unittest.TestCase):
         stdout = output["stdout"]
         assert list(stdout) == ["./file1.txt\n"]
 
+    def test_hash(self):
+        with mock.patch("apps.command_hash", CommandHash()):
+            output = Hash().exec(args=[])
+            assert list(output["stdout"]) == ["hash: hash table empty\n"]
+
+            LocalApp("echo").exec(args=["a"])
+            output = Hash().exec(args=["cat"])
+            assert output["exit_code"] == 0
+            lines = list(Hash().exec(args=[])["stdout"])
+            assert lines[0] == "hits\tcommand\n"
+            assert sorted(line.split("\t")[0].strip() for line in lines[1:]) == ["0", "1"]
+
+            output = Hash().exec(args=["-r"])
+            assert list(Hash().exec(args=[])["stdout"]) == ["hash: hash table empty\n"]
+
+    def test_hash_error(self):
+        output = Hash().exec(args=["notExistCommand"])
+        assert output["stderr"] == "Hash: notExistCommand: not found"
+        output = Hash().exec(args=["-x"])
+        assert output["stderr"] == "Hash: Wrong Flags"
+
+    def test_updatedb(self):
+        with tempfile.TemporaryDirectory() as cache, mock.patch.object(FindIndex, "DIRECTORY", cache):
+            output = Updatedb().exec(args=[])
+            assert output["exit_code"] == 0
+            assert FindIndex.load(".") is not None
+
+            with mock.patch.object(Find, "helper") as walk:
+                output = Find().exec(args=["-name", "file*.txt"])
+                assert sorted(output["stdout"]) == ["./file1.txt\n", "./file2.txt\n"]
+                walk.assert_not_called()
+
+                # changes since the index was built are picked up
+                with open("file3.txt", "w") as f3:
+                    f3.write("file3")
+                output = Find().exec(args=["-name", "file3.txt"])
+                os.remove("file3.txt")
+                assert list(output["stdout"]) == ["./file3.txt\n"]
+
+            output = Updatedb().exec(args=["--rebuild", "."])
+            assert output["exit_code"] == 0
+
+            output = Updatedb().exec(args=["missing"])
+            assert output["stderr"] == "Updatedb: missing: No such directory"
+
+            output = Updatedb().exec(args=["a", "b"])
+            assert output["stderr"] == "Updatedb: Wrong number of command line arguments"
+
+    def test_find_walk(self):
+        expected = set()
+        for a in range(3):
+            for b in range(3):
+                os.makedirs(f"find/d{a}/e{b}")
+                for c in ["x.txt", "y.dat"]:
+                    open(f"find/d{a}/e{b}/{c}", "w").close()
+                expected.add(f"find/d{a}/e{b}/x.txt\n")
+        os.symlink("..", "find/d0/up")
+        try:
+            output = Find().exec(args=["find", "-name", "*.txt"])
+            assert sorted(output["stdout"]) == sorted(expected)
+
+            # links are listed, but not followed
+            output = Find().exec(args=["find", "-name", "up"])
+            assert list(output["stdout"]) == ["find/d0/up\n"]
+
+            output = Find().stream(args=["find", "-name", "*"])
+            assert next(output["stdout"]).startswith("find/")
+            output["stdout"].close()
+        finally:
+            shutil.rmtree("find")
+            os.mkdir("find")
+
+    @given(
+        lines=st.lists(st.text(alphabet="ab\tc", max_size=4), max_size=40),
+        reverse=st.booleans(),
+    )
+    def test_sort_external(self, lines, reverse):
+        stdin = [line + "\n" for line in lines]
+        with mock.patch.object(Sort, "MERGE_WIDTH", 2):
+            output = Sort.helper(stdin, reverse, buffer_size=100)
+            expected = [line + "\n" for line in sorted(lines, reverse=reverse)]
+            assert list(iter_lines(output)) == expected
+
+    def test_sort_parallel(self):
+        lines = [b"%d" % (i * 7919 % 1000) for i in range(1000)] + [b"", b"\xff"]
+        with ProcessPoolExecutor(max_workers=3) as executor:
+            for reverse in [False, True]:
+                with mock.patch.object(Sort, "PARALLEL_THRESHOLD", 0):
+                    parts = Sort.sort_run(list(lines), 1, reverse, executor, 3)
+                assert len(parts) == 3
+                merged = list(heapq.merge(*parts, reverse=reverse))
+                assert merged == sorted(lines, reverse=reverse)
+
+        # small runs stay in this process
+        parts = Sort.sort_run(list(lines), 100, False, executor, 3)
+        assert parts == [sorted(lines)]
+
+    def test_sort_parallel_pool(self):
+        lines = ["%d\n" % (i * 7919 % 1000) for i in range(1000)]
+        # the pool is only started with more than one CPU
+        with mock.patch("apps.os.cpu_count", return_value=4):
+            with mock.patch.object(Sort, "PARALLEL_THRESHOLD", 0):
+                output = Sort.helper(iter(lines), False, buffer_size=1000, parallel=2)
+                assert list(iter_lines(output)) == sorted(lines)
+
+                output = Sort.helper(iter(lines), True, buffer_size=1000, parallel=2)
+                assert next(iter_lines(output)) == "999\n"
+                output.close()
+
+    def test_sort_options(self):
+        args = ["-S", "1b", "-T", ".", "-r", "file1.txt"]
+        output = Sort().exec(args=args)
+        assert list(output["stdout"]) == ["def\n", "adc\n", "abc\n", "abc\n"]
+
+        output = Sort().exec(args=["-S1K", "file1.txt"])
+        assert list(output["stdout"]) == ["abc\n", "abc\n", "adc\n", "def\n"]
+
+        output = Sort().exec(args=["file1.txt", "-S"])
+        assert output["stderr"] == "Sort: Wrong Flags"
+
+        output = Sort().exec(args=["-S", "many", "file1.txt"])
+        assert output["stderr"] == "Sort: Wrong Flags"
+
+        output = Sort().exec(args=["--parallel", "2", "-r", "file1.txt"])
+        assert list(output["stdout"]) == ["def\n", "adc\n", "abc\n", "abc\n"]
+
+        output = Sort().exec(args=["--parallel=0", "file1.txt"])
+        assert output["stderr"] == "Sort: Wrong Flags"
+
+        assert Sort.parse_size("2") == 2048
+        assert Sort.parse_size("3M") == 3 << 20
+
+    def test_stream_is_lazy(self):
+        stdin = (f"{i}\n" for i in itertools.count())
+        output = Head().stream(args=["-n", "2"], stdin=stdin)
+        assert list(iter_lines(output["stdout"])) == ["0\n", "1\n"]
+        # head closes its stdin once it has enough lines
+        with self.assertRaises(StopIteration):
+            next(stdin)
+
+        output = Grep().stream(args=["a.*?c", "file1.txt"])
+        assert next(output["stdout"]).decode() == ["abc\n", "adc\n", "abc\n"]
+
+    def test_stream_wrong_args(self):
+        output = Grep().stream(args=["a", "file3.txt"])
+        assert output["stderr"] == "Grep: file3.txt: No such file or directory"
+        assert list(output["stdout"]) == []
+
+    def test_stream_batches(self):
+        stdin = [LineBatch.from_bytes(b"b\xff\na\n"), "c"]
+        output = Sort().stream(args=[], stdin=stdin)
+        batch = next(output["stdout"])
+        assert isinstance(batch, LineBatch)
+        assert batch.view().tobytes() == b"a\nb\xff\nc\n"
+
+        output = Cut().stream(args=["-b", "2"], stdin=stdin)
+        assert list(iter_lines(output["stdout"])) == ["\udcff\n", "\n", "\n"]
+
+    def test_cat_binary(self):
+        with open("file3.bin", "wb") as f:
+            f.write(bytes(range(256)))
+        output = Cat().stream(args=["file3.bin"])
+        data = b"".join(batch.view() for batch in output["stdout"])
+        os.remove("file3.bin")
+        assert data == bytes(range(256))
+
+    def test_mapped_files(self):
+        with mock.patch.object(FileSource, "MMAP_THRESHOLD", 0):
+            assert list(Cat().exec(args=["file1.txt"])["stdout"]) == ["abc\nadc\nabc\ndef"]
+            assert list(Head().exec(args=["-n", "1", "file1.txt"])["stdout"]) == ["abc\n"]
+            assert list(Tail().exec(args=["-n", "1", "file1.txt"])["stdout"]) == ["def"]
+            output = Grep().exec(args=["ad", "file1.txt", "file2.txt"])["stdout"]
+            assert list(output) == ["file1.txt:adc\n"]
+
+    def test_LocalApp_stream(self):
+        stdin = iter(["abc\n", "adc\n"])
+        output = LocalApp("cat").stream(args=[], stdin=stdin)
+        assert list(iter_lines(output["stdout"])) == ["abc\n", "adc\n"]
+
+        output = LocalApp("ls").stream(args=["notExist"])
+        with self.assertRaises(Exception):
+            list(output["stdout"])
+
+    def test_LocalApp_pipe(self):
+        upstream = LocalApp("cat").stream(args=["file1.txt"])["stdout"]
+        output = LocalApp("sort").stream(args=[], stdin=upstream)["stdout"]
+        assert list(iter_lines(output)) == ["abc\n", "abc\n", "adc\n", "def\n"]
+        # the processes shared an OS pipe, so nothing was fed through Python
+        assert len(output._workers) == 1
+        assert list(upstream) == []
+
+        upstream = LocalApp("ls").stream(args=["notExist"])["stdout"]
+        output = LocalApp("cat").stream(args=[], stdin=upstream)["stdout"]
+        with self.assertRaises(Exception) as context:
+            list(output)
+        assert str(context.exception).startswith("ls: ")
+
+    def test_LocalApp_file_input(self):
+        stdin = FileInput(["file1.txt"])
+        output = LocalApp("sort").stream(args=[], stdin=stdin)["stdout"]
+        assert list(iter_lines(output)) == ["abc\n", "abc\n", "adc\n", "def\n"]
+        # the process read the file itself, so nothing was fed through Python
+        assert len(output._workers) == 1
+        assert list(stdin) == []
+
+    def test_LocalApp_unread(self):
+        output = LocalApp("touch").stream(args=["touched.txt"])["stdout"]
+        output.wait()
+        try:
+            assert os.path.exists("touched.txt")
+        finally:
+            os.remove("touched.txt")
+        # a process writing to nobody stops with SIGPIPE, as in bash
+        output = LocalApp("yes").stream(args=[])["stdout"]
+        output.wait()
+        assert output._process.returncode is not None
+
+    def test_LocalApp_pipe_stops_early(self):
+        upstream = LocalApp("yes").stream(args=[])["stdout"]
+        output = LocalApp("cat").stream(args=[], stdin=upstream)["stdout"]
+        assert next(iter_lines(output)) == "y\n"
+        output.close()
+        assert upstream._process.returncode is not None
+
     def test_LocalApp(self):
         args = []
         output = LocalApp("ls").exec(args=args)
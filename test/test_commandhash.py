@@ -0,0 +1,62 @@
+import os
+import stat
+import tempfile
+import unittest
+
+import mock
+
+from commandhash import CommandHash
+
+
+class TestCommandHash(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bin = tempfile.TemporaryDirectory()
+        self.tool = os.path.join(self.bin.name, "tool")
+        with open(self.tool, "w") as f:
+            f.write("#!/bin/sh\n")
+        os.chmod(self.tool, stat.S_IRWXU)
+        self.hash = CommandHash()
+        self.searches = 0
+
+    def tearDown(self) -> None:
+        self.bin.cleanup()
+
+    def search(self, name):
+        self.searches += 1
+        path = os.path.join(self.bin.name, name)
+        return path if os.access(path, os.X_OK) else None
+
+    def test_lookup_cached(self):
+        with mock.patch.dict(os.environ, {"PATH": self.bin.name}):
+            for _ in range(3):
+                assert self.hash.lookup("tool", self.search) == self.tool
+            assert self.searches == 1
+            assert self.hash.entries()["tool"].hits == 3
+
+    def test_lookup_missing(self):
+        with mock.patch.dict(os.environ, {"PATH": self.bin.name}):
+            assert self.hash.lookup("missing", self.search) is None
+            assert self.hash.lookup("missing", self.search) is None
+            assert self.searches == 1
+            assert "missing" not in self.hash.entries()
+
+    def test_lookup_path_changed(self):
+        with mock.patch.dict(os.environ, {"PATH": self.bin.name}):
+            self.hash.lookup("tool", self.search)
+        with mock.patch.dict(os.environ, {"PATH": "/nowhere"}):
+            self.hash.lookup("tool", self.search)
+        assert self.searches == 2
+
+    def test_lookup_not_executable(self):
+        with mock.patch.dict(os.environ, {"PATH": self.bin.name}):
+            self.hash.lookup("tool", self.search)
+            os.chmod(self.tool, stat.S_IRUSR)
+            assert self.hash.lookup("tool", self.search) is None
+            assert self.searches == 2
+
+    def test_add_clear(self):
+        with mock.patch.dict(os.environ, {"PATH": self.bin.name}):
+            assert self.hash.add("tool", self.search) == self.tool
+            assert self.hash.entries()["tool"].hits == 0
+            self.hash.clear()
+            assert self.hash.entries() == {}
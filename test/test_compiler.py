@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from compiler import Compiler, ConcurrentCompiler, PlanCache
+from linebatch import iter_lines
+from parsecache import parse
+from visitor import ConcurrentASTVisitor, StreamingASTVisitor
+
+COMMANDS = [
+    "echo hello world",
+    "echo 'a  b' \"c `echo d`\" e`echo f`g",
+    "cat file1.txt file2.txt | grep a | sort -r",
+    "echo *.txt",
+    "echo *.none",
+    "echo file?.txt '*'.txt \"f\"*[12].txt",
+    "cat **/*.txt",
+    "echo `echo file`?.txt",
+    "echo `echo *`",
+    "cat < file1.txt",
+    "cat < *1.txt | head -n 2",
+    "< file2.txt cat > out.txt; cat out.txt",
+    "echo x > *1.txt; cat file1.txt",
+    "`echo echo` hi; echo bye",
+    "_ls missing; echo after",
+    "_cat missing | _grep a",
+    'echo "`_ls missing`"',
+    "cd find; ls; cd ..",
+    "ls missing",
+    "cat < missing",
+    "pwd < file1.txt < file2.txt",
+    "echo a > b > c",
+    '"echo" a',
+    "echo `'missing`",
+    "`_ls missing` a",
+    "touch touched.txt | echo hi; ls",
+]
+
+
+def outcome(run):
+    try:
+        out = run()
+        stdout = "".join(iter_lines(out["stdout"]))
+        return stdout, list(out["stderr"]), bool(out["exit_code"])
+    except Exception as e:
+        return type(e)
+
+
+class TestCompiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self._make_tree()
+
+    def tearDown(self) -> None:
+        self._remove_tree()
+
+    def _make_tree(self):
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        os.mkdir("find")
+        with open("find/inner.txt", "w") as f:
+            f.write("inner\n")
+        with open("file1.txt", "w") as f:
+            f.write("abc\nadc\nabc\ndef\n")
+        with open("file2.txt", "w") as f:
+            f.write("file2\ncontent\n")
+
+    def _remove_tree(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def _parity(self, compiler, visitor):
+        for cmdline in COMMANDS:
+            # every command runs in a tree of its own, as some change it
+            self._remove_tree()
+            self._make_tree()
+            expected = outcome(lambda: parse(cmdline).accept(visitor))
+            self._remove_tree()
+            self._make_tree()
+            actual = outcome(compiler.compile(parse(cmdline)))
+            assert actual == expected, cmdline
+
+    def test_compiler_parity(self):
+        self._parity(Compiler(), StreamingASTVisitor())
+
+    @mock.patch.object(StreamingASTVisitor, "GLOB", "product")
+    def test_compiler_parity_glob_product(self):
+        self._parity(Compiler(), StreamingASTVisitor())
+
+    def test_concurrent_compiler_parity(self):
+        self._parity(ConcurrentCompiler(), ConcurrentASTVisitor())
+
+    @mock.patch.object(StreamingASTVisitor, "GLOB", "product")
+    def test_plan_runs_again(self):
+        plan = Compiler().compile(parse("echo *.txt `cat file2.txt`"))
+        first = outcome(plan)[0].splitlines()
+        with open("file3.txt", "w") as f:
+            f.write("more")
+        second = outcome(plan)[0].splitlines()
+        assert sorted(first) == ["file1.txt file2 content", "file2.txt file2 content"]
+        assert sorted(second) == sorted(first + ["file3.txt file2 content"])
+
+    def test_plan_glob_single_run(self):
+        plan = Compiler().compile(parse("echo *.txt `cat file2.txt`"))
+        words = outcome(plan)[0].split()
+        assert sorted(words) == ["content", "file1.txt", "file2", "file2.txt"]
+
+    def test_plan_pipe_unread_local_app(self):
+        for compiler in [Compiler(), ConcurrentCompiler()]:
+            command = "sh -c 'sleep 0.2; touch touched.txt' | echo hi"
+            plan = compiler.compile(parse(command))
+            assert outcome(plan) == ("hi\n", [], False)
+            # touch ran, and was waited for, though nothing read its output
+            assert os.path.exists("touched.txt")
+            os.remove("touched.txt")
+
+    def test_plan_static_args(self):
+        compiler = Compiler()
+        plan = compiler.compile(parse("echo a b"))
+        args = compiler.compile_args(parse("echo a b").args)
+        assert args() == [["a", "b"]]
+        assert args() is not args()
+        assert outcome(plan)[0] == "a b\n"
+
+    def test_plan_cache(self):
+        plans = PlanCache(Compiler(), maxsize=4)
+        plan = plans.parse("echo a")
+        assert plans.parse("echo a") is plan
+        assert plans.cache_info().hits == 1
+        assert plans.file is None
@@ -0,0 +1,115 @@
+import unittest
+import mock
+
+import abstract_syntax_tree
+import descentparser as dp
+import parsercombinator as pc
+from abstract_syntax_tree import AST, Call, DoubleQuote, Pipe, Seq, Substitution
+from hypothesis import given
+from hypothesis import strategies as st
+from parsy import ParseError
+
+# inputs of the parsercombinator tests, as whole command lines
+COMMANDS = [
+    "echo ''",
+    "echo 'a b;c|d'",
+    "echo `echo a`",
+    "echo \"`echo cat` hello.txt 'abc'\"",
+    'echo "Full String"',
+    'echo "aabbcc`asd`"',
+    "echo `echo cat`hello.txt'abc'\"`echo hey`wow\"",
+    "cat < text.txt",
+    "cat <text.txt >  out.txt",
+    "< text.txt call `hello.txt` > output.txt",
+    "call ; < text.txt call `hello.txt` > output.txt",
+    "call | < text.txt call `hello.txt` > output.txt",
+    "< *.py hello | < text.txt call `hello.txt` > output.txt ; ls",
+    'echo"x"y `a`b "c"d',
+    "a >b'c' d<e",
+    'echo "a`b"`c" d',
+    "  echo\ta\nb  ",
+]
+
+ERRORS = [
+    "",
+    "  ",
+    "'a' b",
+    "a;",
+    "| a",
+    "a <",
+    "a < 'x'",
+    "echo 'a",
+    "echo `a",
+    '"a\nb"',
+]
+
+
+def dump(node):
+    """
+    :returns: nested tuples of the fields of an AST, which compare equal
+              for equal trees
+    """
+    if isinstance(node, AST):
+        fields = sorted(node.__slots__)
+        return (type(node).__name__,) + tuple(dump(getattr(node, f)) for f in fields)
+    if isinstance(node, (list, tuple)):
+        return tuple(map(dump, node))
+    return node
+
+
+def outcome(parser, text):
+    try:
+        return dump(parser(text))
+    except ParseError:
+        return ParseError
+    except AssertionError:
+        return AssertionError
+
+
+class TestDescentParser(unittest.TestCase):
+    def test_tokenize(self):
+        tokens = dp.tokenize("a'b' |")
+        assert [kind for kind, _, _ in tokens] == [
+            "unquoted",
+            "single",
+            "space",
+            "op",
+            "eof",
+        ]
+        assert [index for _, _, index in tokens] == [0, 1, 4, 5, 6]
+
+    def test_double_quote(self):
+        dq = dp.parse('echo "a `b` c"').args[0][0]
+        assert isinstance(dq, DoubleQuote) and dq.containSubstitution
+        assert dq.quotedPart[0] == "a "
+        assert isinstance(dq.quotedPart[1], Substitution)
+        assert dq.quotedPart[1].quoted == "b"
+        assert dq.quotedPart[2] == " c"
+
+    def test_command(self):
+        cmd = dp.parse("< a.txt cat `echo b` > c.txt | sort ; ls")
+        assert isinstance(cmd, Seq) and isinstance(cmd.left, Pipe)
+        call = cmd.left.left
+        assert isinstance(call, Call) and call.appName == "cat"
+        assert len(call.redirects) == 2
+
+    def test_parity(self):
+        for text in COMMANDS:
+            assert outcome(dp.parse, text) == outcome(pc.command.parse, text), text
+            assert outcome(dp.parse, text) not in (ParseError, AssertionError)
+
+    def test_parity_errors(self):
+        for text in ERRORS:
+            assert outcome(pc.command.parse, text) is ParseError, text
+            assert outcome(dp.parse, text) is ParseError, text
+        with mock.patch.object(abstract_syntax_tree, "DEBUG", True):
+            with self.assertRaises(AssertionError):
+                dp.parse("a > b > c > d")
+
+    @given(text=st.text(alphabet="ab *;|<>'\"`\t\n", max_size=30))
+    def test_parity_random(self, text):
+        assert outcome(dp.parse, text) == outcome(pc.command.parse, text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import mmap
+import os
+import tempfile
+import unittest
+
+from filesource import FileSource
+from linebatch import iter_lines
+
+
+class TestFileSource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.txt")
+        self.content = "".join(f"line {i}\n" for i in range(1000)) + "last"
+        with open(self.path, "w") as f:
+            f.write(self.content)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_mapped_batches(self):
+        with FileSource(self.path, threshold=0) as source:
+            self.assertTrue(source.mapped)
+            batches = list(source.batches(size=100))
+            self.assertGreater(len(batches), 1)
+            self.assertIsInstance(batches[0].buffer.obj, mmap.mmap)
+            self.assertEqual("".join(iter_lines(batches)), self.content)
+
+    def test_small_file_is_read(self):
+        with FileSource(self.path, threshold=1 << 30) as source:
+            self.assertFalse(source.mapped)
+            self.assertEqual("".join(iter_lines(source.batches(size=100))), self.content)
+
+    def test_line_longer_than_batch(self):
+        with open(self.path, "w") as f:
+            f.write("a" * 300 + "\nb\n")
+        with FileSource(self.path, threshold=0) as source:
+            lines = [bytes(line) for line in source.lines()]
+        self.assertEqual(lines, [b"a" * 300 + b"\n", b"b\n"])
+
+    def test_random_access(self):
+        for threshold in [0, 1 << 30]:
+            with FileSource(self.path, threshold=threshold) as source:
+                self.assertEqual(len(source), len(self.content))
+                self.assertEqual(bytes(source.read(5, 7)), b"0\n")
+                self.assertEqual(bytes(source.read(len(source) - 4, len(source))), b"last")
+
+    def test_empty_file(self):
+        open(self.path, "w").close()
+        with FileSource(self.path, threshold=0) as source:
+            self.assertFalse(source.mapped)
+            self.assertEqual(list(source.batches()), [])
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            FileSource(os.path.join(self.tmp.name, "missing.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+import mock
+
+from findindex import FindIndex
+
+
+class TestFindIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = tempfile.TemporaryDirectory()
+        self.tree = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.object(FindIndex, "DIRECTORY", self.cache.name)
+        self.patch.start()
+        self.root = self.tree.name
+        os.makedirs(os.path.join(self.root, "a", "b"))
+        for name in ["x.txt", "a/y.txt", "a/b/z.txt", "a/b/w.dat"]:
+            open(os.path.join(self.root, name), "w").close()
+
+    def tearDown(self) -> None:
+        self.patch.stop()
+        self.cache.cleanup()
+        self.tree.cleanup()
+
+    def settle(self):
+        # as if the tree had been left alone for a while
+        past = (1, 1)
+        for directory, _, _ in os.walk(self.root):
+            os.utime(directory, ns=past)
+
+    def test_find(self):
+        index = FindIndex(self.root)
+        self.assertTrue(index.refresh())
+        found = sorted(index.find("*.txt"))
+        expected = [self.root + p + "\n" for p in ["/a/b/z.txt", "/a/y.txt", "/x.txt"]]
+        self.assertEqual(found, expected)
+
+    def test_save_load(self):
+        self.assertIsNone(FindIndex.load(self.root))
+        index = FindIndex(self.root)
+        index.refresh()
+        index.save()
+        loaded = FindIndex.load(self.root)
+        self.assertEqual(loaded.dirs, index.dirs)
+
+    def test_refresh_only_changed(self):
+        self.settle()
+        index = FindIndex(self.root)
+        index.refresh()
+        with mock.patch.object(FindIndex, "_scan", wraps=FindIndex._scan) as scan:
+            self.assertFalse(index.refresh())
+            self.assertEqual(scan.call_count, 0)
+
+            open(os.path.join(self.root, "a", "b", "new.txt"), "w").close()
+            self.assertTrue(index.refresh())
+            self.assertEqual(scan.call_count, 1)
+        self.assertIn(self.root + "/a/b/new.txt\n", list(index.find("new*")))
+
+    def test_refresh_removed(self):
+        self.settle()
+        index = FindIndex(self.root)
+        index.refresh()
+        os.remove(os.path.join(self.root, "a", "b", "z.txt"))
+        os.remove(os.path.join(self.root, "a", "b", "w.dat"))
+        os.rmdir(os.path.join(self.root, "a", "b"))
+        self.assertTrue(index.refresh())
+        self.assertNotIn("a/b", index.dirs)
+        self.assertEqual(list(index.find("z.txt")), [])
+
+    def test_recent_directories_are_rescanned(self):
+        index = FindIndex(self.root)
+        index.refresh()
+        # modified just now, so the listing might miss a change made within
+        # the same mtime tick
+        self.assertIsNone(index.dirs[""][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
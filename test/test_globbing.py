@@ -0,0 +1,87 @@
+import glob
+import os
+import tempfile
+import unittest
+
+import mock
+
+from abstract_syntax_tree import SingleQuote
+from globbing import Listings, Replay, iglob, product
+from visitor import StreamingASTVisitor
+
+PATTERNS = [
+    "*",
+    "*.txt",
+    "a/*",
+    "*/*.txt",
+    "a*/",
+    "**",
+    "**/",
+    "**/*.txt",
+    "a/**",
+    "a/**/*.dat",
+    "**/b/*",
+    "?.txt",
+    "a/b/[wz].*",
+    "a/b/[!w]*",
+    ".*",
+    "a/.*",
+    "none*",
+    "none/*",
+    "x.txt",
+    "a//y*",
+]
+
+
+class TestGlobbing(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.tree = tempfile.TemporaryDirectory()
+        os.chdir(self.tree.name)
+        os.makedirs("a/b")
+        os.makedirs("a/.hidden")
+        for name in ["x.txt", "yy.txt", ".dot", "a/y.txt", "a/b/z.txt", "a/b/w.dat"]:
+            open(name, "w").close()
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        self.tree.cleanup()
+
+    def test_iglob_parity(self):
+        for pattern in PATTERNS:
+            expected = glob.glob(pattern, recursive=True)
+            self.assertEqual(list(iglob(pattern, Listings())), expected, pattern)
+
+    def test_iglob_absolute(self):
+        pattern = os.path.join(self.tree.name, "**", "*.txt")
+        expected = glob.glob(pattern, recursive=True)
+        self.assertEqual(list(iglob(pattern, Listings())), expected)
+
+    def test_iglob_literal_prefix(self):
+        with mock.patch("globbing.os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual(list(iglob("a/b/*.txt", Listings())), ["a/b/z.txt"])
+        # neither the current directory nor a are listed
+        self.assertEqual(scandir.call_count, 1)
+
+    def test_listings_shared(self):
+        listings = Listings()
+        with mock.patch("globbing.os.scandir", wraps=os.scandir) as scandir:
+            list(iglob("a/*.txt", listings))
+            list(iglob("a/b*", listings))
+            list(iglob("a/", listings))
+        self.assertEqual(scandir.call_count, 1)
+
+    def test_product(self):
+        a, b = Replay(iter("ab")), Replay(iter("xyz"))
+        self.assertEqual(list(product(a, b)), [(x, y) for x in "ab" for y in "xyz"])
+        self.assertEqual(list(product()), [()])
+
+    def test_visitor_quoted_parts(self):
+        open("a*.txt", "w").close()
+        visitor = StreamingASTVisitor()
+        parsed_arg, glob_index, globbed_result = visitor._getArgs(
+            [[SingleQuote("a*"), ".t?t"]]
+        )
+        args = visitor._getGlobbedArg(parsed_arg, glob_index, globbed_result)
+        # the quoted asterisk only matches itself
+        self.assertEqual(list(args), [["a*.txt"]])
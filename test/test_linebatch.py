@@ -0,0 +1,62 @@
+import io
+import unittest
+
+from linebatch import LineBatch, iter_batches, iter_bytes, iter_lines, read_batches
+
+
+class TestLineBatch(unittest.TestCase):
+    def test_from_bytes(self):
+        batch = LineBatch.from_bytes(b"abc\nde\nf")
+        self.assertEqual(len(batch), 3)
+        self.assertEqual([bytes(line) for line in batch], [b"abc\n", b"de\n", b"f"])
+        self.assertEqual(list(batch.offsets), [0, 4, 7, 8])
+
+    def test_from_bytes_end(self):
+        batch = LineBatch.from_bytes(b"abc\nde\nf", 7)
+        self.assertEqual(batch.decode(), ["abc\n", "de\n"])
+
+    def test_from_buffer(self):
+        data = b"xx\nabc\nde\nf"
+        batch = LineBatch.from_buffer(data, 3, len(data))
+        self.assertEqual(list(batch.offsets), [3, 7, 10, 11])
+        self.assertEqual(batch.decode(), ["abc\n", "de\n", "f"])
+        self.assertIs(batch.buffer.obj, data)
+
+    def test_from_lines(self):
+        batch = LineBatch.from_lines([b"abc", b"de\n"])
+        self.assertEqual(batch.decode(), ["abc", "de\n"])
+
+    def test_slice_shares_buffer(self):
+        batch = LineBatch.from_bytes(b"a\nb\nc\n")
+        sliced = batch.slice(1, 2)
+        self.assertEqual(sliced.decode(), ["b\n"])
+        self.assertIs(sliced.buffer.obj, batch.buffer.obj)
+        self.assertEqual(batch.slice(1).view().tobytes(), b"b\nc\n")
+
+    def test_split(self):
+        self.assertEqual(LineBatch.from_bytes(b"a\n\nbc\n").split(), [b"a", b"", b"bc"])
+        self.assertEqual(LineBatch.from_bytes(b"a\nbc").split(), [b"a", b"bc"])
+        self.assertEqual(LineBatch.from_bytes(b"").split(), [])
+
+    def test_empty(self):
+        batch = LineBatch.from_bytes(b"")
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.decode(), [])
+
+    def test_undecodable_round_trip(self):
+        lines = list(iter_lines([LineBatch.from_bytes(b"\xff\xfe\n")]))
+        self.assertEqual(b"".join(iter_bytes(lines)), b"\xff\xfe\n")
+
+    def test_iter_batches(self):
+        batches = list(iter_batches(["a\nb\n", b"c\n", LineBatch.from_bytes(b"d")]))
+        self.assertTrue(all(isinstance(b, LineBatch) for b in batches))
+        self.assertEqual(list(iter_lines(batches)), ["a\n", "b\n", "c\n", "d"])
+
+    def test_read_batches(self):
+        f = io.BufferedReader(io.BytesIO(b"abc\ndefgh\nij"))
+        batches = list(read_batches(f, size=4))
+        self.assertEqual(list(iter_lines(batches)), ["abc\n", "defgh\n", "ij"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from abstract_syntax_tree import Call, Pipe
+from parsecache import ParseCache
+from parsercombinator import command
+from parsy import ParseError
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = ParseCache(command.parse, maxsize=2, file=None)
+
+    def test_parse_cache_hits(self):
+        first = self.cache.parse("echo a | cat")
+        second = self.cache.parse("echo a | cat")
+        assert isinstance(first, Pipe)
+        assert first is second
+        info = self.cache.cache_info()
+        assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 1, 2, 1)
+
+    def test_parse_cache_evicts_least_recent(self):
+        a = self.cache.parse("echo a")
+        self.cache.parse("echo b")
+        self.cache.parse("echo a")
+        self.cache.parse("echo c")
+        assert self.cache.parse("echo a") is a
+        assert self.cache.cache_info().misses == 3
+        self.cache.parse("echo b")
+        assert self.cache.cache_info().misses == 4
+
+    def test_parse_cache_errors(self):
+        for _ in range(2):
+            with self.assertRaises(ParseError):
+                self.cache.parse("echo 'a")
+        assert self.cache.cache_info().currsize == 0
+
+    def test_parse_cache_clear(self):
+        self.cache.parse("echo a")
+        self.cache.cache_clear()
+        assert self.cache.cache_info() == (0, 0, 2, 0)
+
+    def test_parse_cache_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache", "parse.pickle")
+            cache = ParseCache(command.parse, file=path)
+            cache.save()
+            assert not os.path.exists(path)
+            cache.parse("echo a")
+            cache.parse("cat b")
+            cache.save()
+
+            warm = ParseCache(command.parse, maxsize=1, file=path)
+            ast = warm.parse("cat b")
+            assert isinstance(ast, Call) and ast.appName == "cat"
+            assert warm.cache_info().hits == 1
+            assert warm.cache_info().currsize == 1
+
+            with open(path, "wb") as f:
+                f.write(b"not a pickle")
+            cold = ParseCache(command.parse, file=path)
+            cold.parse("cat b")
+            assert cold.cache_info().misses == 1
@@ -1,5 +1,7 @@
 import unittest
+import mock
 
+import abstract_syntax_tree
 import parsercombinator as pc
 from abstract_syntax_tree import (
     DoubleQuote,
@@ -55,6 +57,25 @@ class TestParserCombinator(unittest.TestCase):
         dq = pc.doubleQuoted.parse(word)
         assert "".join(dq.quotedPart) == "Full String"
 
+    def test_doubleQuote_runs(self):
+        dq = pc.doubleQuoted.parse('"ab `c` d"')
+        assert dq.quotedPart[0] == "ab " and dq.quotedPart[2] == " d"
+        assert dq.containSubstitution
+        assert not hasattr(dq, "__dict__")
+
+    def test_literals_interned(self):
+        first = pc.command.parse("echo '" + "x" * 50 + "' a" + "b" * 50)
+        second = pc.command.parse("echo '" + "x" * 50 + "' a" + "b" * 50)
+        assert first.args[0][0].quotedPart is second.args[0][0].quotedPart
+        assert first.args[1][0] is second.args[1][0]
+
+    def test_call_validation(self):
+        call = pc.command.parse("a > b > c > d")
+        assert len(call.redirects) == 3
+        with mock.patch.object(abstract_syntax_tree, "DEBUG", True):
+            with self.assertRaises(AssertionError):
+                pc.command.parse("a > b > c > d")
+
     def test_quoted(self):
         word = '"aabbcc`asd`"'
         q = pc.quoted.parse(word)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import subcache
+from abstract_syntax_tree import Substitution
+from compiler import Compiler
+from parsecache import parse
+from subcache import SubstitutionCache
+from visitor import StreamingASTVisitor
+
+
+class TestSubstitutionCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.tick = 0
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        os.mkdir("conf")
+        self._write("conf/conf.txt", "conf\n")
+        self._write("a.txt", "a\n")
+        self.cache = SubstitutionCache(maxsize=4)
+        self.visitor = StreamingASTVisitor()
+        self.runs = 0
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def _write(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+        # a new mtime on every write, but old enough to be cached at once
+        self.tick += 1
+        mtime = 10**15 + self.tick
+        os.utime(path, ns=(mtime, mtime))
+        os.utime(os.path.dirname(path) or ".", ns=(mtime, mtime))
+
+    def _run(self, text):
+        def evaluate():
+            self.runs += 1
+            return self.visitor._evaluateSub(parse(text))
+
+        return "".join(self.cache.run(text, evaluate)["stdout"])
+
+    def test_sub_cache_eligible(self):
+        for text in ["echo a", "cat a.txt | sort", "find . -name '*.txt'", "echo `cat a`"]:
+            assert self.cache.eligible(parse(text)), text
+        for text in ["cd conf", "rev a.txt", "echo a > b", "`echo cat` a", "echo `rev a`"]:
+            assert not self.cache.eligible(parse(text)), text
+
+    def test_sub_cache_file(self):
+        assert self._run("cat a.txt") == "a"
+        assert self._run("cat a.txt") == "a"
+        assert self.runs == 1 and self.cache.cache_info().hits == 1
+        self._write("a.txt", "b\n")
+        assert self._run("cat a.txt") == "b"
+        assert self.runs == 2
+
+    def test_sub_cache_directory(self):
+        text = "find . -name '*.txt'"
+        assert sorted(self._run(text).split()) == ["./a.txt", "./conf/conf.txt"]
+        self._run(text)
+        assert self.runs == 1
+        self._write("conf/new.txt", "")
+        assert len(self._run(text).split()) == 3
+        assert self.runs == 2
+
+    def test_sub_cache_missing_file(self):
+        assert self._run("_cat b.txt") == ""
+        self._run("_cat b.txt")
+        assert self.runs == 1
+        self._write("b.txt", "b\n")
+        assert self._run("_cat b.txt") == "b"
+
+    def test_sub_cache_glob_deleted(self):
+        os.mkdir("d1")
+        self._write("d1/x.txt", "")
+        # rewritten to age the current directory along with it
+        self._write("a.txt", "a\n")
+        assert self._run("echo */x.txt") == "d1/x.txt"
+        self._run("echo */x.txt")
+        assert self.runs == 1
+        # only d1 changes, which the glob never lists
+        os.remove("d1/x.txt")
+        assert self._run("echo */x.txt") == "*/x.txt"
+        assert self.runs == 2
+
+    def test_sub_cache_cwd(self):
+        self._run("ls")
+        os.chdir("conf")
+        assert self._run("ls") == "conf.txt"
+        assert self.runs == 2
+
+    def test_sub_cache_recent(self):
+        with open("recent.txt", "w") as f:
+            f.write("new\n")
+        self._run("cat recent.txt")
+        self._run("cat recent.txt")
+        assert self.runs == 2
+
+    def test_sub_cache_nested(self):
+        self._run("echo `cat a.txt`")
+        self._run("cat a.txt")
+        assert self.runs == 2
+        self._write("a.txt", "c\n")
+        assert self._run("echo `cat a.txt`") == "c"
+
+    def test_sub_cache_visitor(self):
+        with mock.patch.object(subcache.sub_cache, "maxsize", 4):
+            for run in [
+                lambda: self.visitor.visit_sub(Substitution("cat a.txt")),
+                Compiler().compile_sub(Substitution("cat a.txt")),
+            ]:
+                subcache.sub_cache.cache_clear()
+                assert "".join(run()["stdout"]) == "a"
+                assert "".join(run()["stdout"]) == "a"
+                assert subcache.sub_cache.cache_info().hits == 1
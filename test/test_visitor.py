@@ -1,7 +1,12 @@
 from collections import deque
+from glob import glob
+from itertools import product
 import unittest
 
-from visitor import ASTVisitor
+import mock
+
+from apps import ProcessOutput
+from visitor import ASTVisitor, ConcurrentASTVisitor, StreamingASTVisitor
 from abstract_syntax_tree import (
     DoubleQuote,
     Substitution,
@@ -12,6 +17,9 @@ from abstract_syntax_tree import (
     Seq,
     Pipe,
 )
+from filesource import FileInput
+from linebatch import iter_lines
+from parsecache import parse_cache
 import os
 
 
@@ -80,6 +88,16 @@ class TestASTVisitor(unittest.TestCase):
         self.assertEqual("".join(out["stderr"]), "")
         self.assertEqual(out["exit_code"], 0)
 
+    def test_visit_substitution_parse_cache(self):
+        i = Substitution("echo cached")
+        misses = parse_cache.cache_info().misses
+        hits = parse_cache.cache_info().hits
+        for _ in range(3):
+            out = self.visitor.visit_sub(i)
+            self.assertEqual("".join(out["stdout"]), "cached")
+        assert parse_cache.cache_info().misses <= misses + 1
+        assert parse_cache.cache_info().hits >= hits + 2
+
     def test_visit_substitution_error(self):
         i = Substitution("_ls a b")
         out = self.visitor.visit_sub(i)
@@ -379,6 +397,160 @@ class TestASTVisitor(unittest.TestCase):
         assert len(out["stderr"]) > 0
         self.assertNotEquals(out["exit_code"], 1)
 
+    def test_streaming_visit_pipe(self):
+        visitor = StreamingASTVisitor()
+        i = Pipe(
+            Call(redirects=[RedirectIn("file1.txt")], appName="cat", args=[]),
+            Call(redirects=[], appName="grep", args=[["a.c"]]),
+        )
+        out = visitor.visit_pipe(i)
+        self.assertNotIsInstance(out["stdout"], deque)
+        self.assertEqual(list(iter_lines(out["stdout"])), ["abc\n", "adc\n", "abc\n"])
+        self.assertEqual(out["exit_code"], 0)
+
+    def test_streaming_visit_redirectout(self):
+        visitor = StreamingASTVisitor()
+        i = RedirectOut("testStreamingRedirectout.txt")
+        visitor.visit_redirect_out(i, stdin=iter(["aaa\n", "bbb\n"]))
+        with open("testStreamingRedirectout.txt") as f:
+            self.assertEqual(f.read(), "aaa\nbbb\n")
+        os.remove("testStreamingRedirectout.txt")
+
+    def test_concurrent_visit_pipe(self):
+        visitor = ConcurrentASTVisitor()
+        i = Pipe(
+            Pipe(
+                Call(redirects=[RedirectIn("file1.txt")], appName="cat", args=[]),
+                Call(redirects=[], appName="grep", args=[["a.c"]]),
+            ),
+            Call(redirects=[], appName="sort", args=[["-r"]]),
+        )
+        out = visitor.visit_pipe(i)
+        self.assertEqual(list(iter_lines(out["stdout"])), ["adc\n", "abc\n", "abc\n"])
+        self.assertEqual(out["exit_code"], 0)
+
+    def test_concurrent_visit_pipe_stage_error(self):
+        visitor = ConcurrentASTVisitor()
+        i = Pipe(
+            Call(redirects=[], appName="ls", args=[["notExist"]]),
+            Call(redirects=[], appName="grep", args=[["a"]]),
+        )
+        with self.assertRaises(Exception):
+            list(visitor.visit_pipe(i)["stdout"])
+
+    def test_visit_pipe_local_apps(self):
+        i = Pipe(
+            Call(redirects=[], appName="tac", args=[["file1.txt"]]),
+            Call(redirects=[], appName="tr", args=[["a"], ["A"]]),
+        )
+        for visitor in [StreamingASTVisitor(), ConcurrentASTVisitor()]:
+            out = visitor.visit_pipe(i)
+            # the second process reads the first straight from an OS pipe
+            assert isinstance(out["stdout"].stdin, ProcessOutput)
+            self.assertEqual(
+                list(iter_lines(out["stdout"])), ["defAbc\n", "Adc\n", "Abc\n"]
+            )
+
+    def test_visit_call_local_app_redirects(self):
+        i = Call(
+            redirects=[RedirectIn("file1.txt"), RedirectOut("testRedirectFds.txt")],
+            appName="tac",
+            args=[],
+        )
+        try:
+            for visitor in [StreamingASTVisitor(), ConcurrentASTVisitor()]:
+                # the process reads and writes the files itself
+                with mock.patch.object(FileInput, "__next__", side_effect=OSError):
+                    visitor.visit_call(i)
+                with open("testRedirectFds.txt") as f:
+                    self.assertEqual(f.read(), "defabc\nadc\nabc\n")
+        finally:
+            os.remove("testRedirectFds.txt")
+
+    def test_visit_pipe_unread_local_app(self):
+        i = Pipe(
+            Call(
+                redirects=[],
+                appName="sh",
+                args=[["-c"], ["sleep 0.2; touch testTouched.txt"]],
+            ),
+            Call(redirects=[], appName="echo", args=[["hi"]]),
+        )
+        for visitor in [StreamingASTVisitor(), ConcurrentASTVisitor()]:
+            try:
+                out = visitor.visit_pipe(i)
+                self.assertEqual(list(iter_lines(out["stdout"])), ["hi\n"])
+                # touch ran, and was waited for, though nothing read its output
+                assert os.path.exists("testTouched.txt")
+            finally:
+                if os.path.exists("testTouched.txt"):
+                    os.remove("testTouched.txt")
+
+    def test_visit_pipe_stops_upstream(self):
+        i = Pipe(
+            Call(redirects=[], appName="yes", args=[]),
+            Call(redirects=[], appName="head", args=[["-n"], ["2"]]),
+        )
+        for visitor in [StreamingASTVisitor(), ConcurrentASTVisitor()]:
+            out = visitor.visit_pipe(i)
+            self.assertEqual(list(iter_lines(out["stdout"])), ["y\n", "y\n"])
+
+    def test_visit_call_args_glob_expansion(self):
+        visitor = StreamingASTVisitor()
+        files = glob("file*.txt")
+        parsed_arg, glob_index, globbed_result = visitor._getArgs(
+            [["file*.txt"], ["-"], ["none*"]]
+        )
+        args_lst = visitor._getGlobbedArg(parsed_arg, glob_index, globbed_result)
+        # a single run, with a glob without matches left as it is
+        assert list(args_lst) == [files + ["-", "none*"]]
+
+    def test_visit_call_args_glob_arg_max(self):
+        visitor = StreamingASTVisitor()
+        files = glob("file*.txt")
+        parsed_arg, glob_index, globbed_result = visitor._getArgs(
+            [["-"], ["file*.txt"], ["+"]]
+        )
+        # room for the fixed arguments and a single match in each run
+        arg_max = 2 * 10 + 9 + len("file1.txt")
+        args_lst = visitor._getGlobbedArg(
+            parsed_arg, glob_index, globbed_result, arg_max
+        )
+        assert list(args_lst) == [["-", f, "+"] for f in files]
+
+    @mock.patch.object(StreamingASTVisitor, "GLOB", "product")
+    def test_visit_call_args_glob_lazy(self):
+        visitor = StreamingASTVisitor()
+        args = [["file*.txt"], ["-"], ["file*.txt"]]
+        files = glob("file*.txt")
+        with mock.patch("globbing.os.scandir", wraps=os.scandir) as scandir:
+            parsed_arg, glob_index, globbed_result = visitor._getArgs(args)
+            args_lst = visitor._getGlobbedArg(parsed_arg, glob_index, globbed_result)
+            first = next(args_lst)
+            assert first == [files[0], "-", files[0]]
+            rest = list(args_lst)
+        # the directory is listed once for both arguments
+        assert scandir.call_count == 1
+        expected = [[a, "-", b] for a, b in product(files, repeat=2)]
+        assert [first] + rest == expected
+
+    @mock.patch.object(StreamingASTVisitor, "GLOB", "product")
+    def test_streaming_visit_call_glob_runs_lazily(self):
+        visitor = StreamingASTVisitor()
+        i = Call(redirects=[], appName="cat", args=[["file*.txt"]])
+        out = visitor.visit_call(i)
+        last = glob("file*.txt")[-1]
+        with open(last) as f:
+            content = f.read()
+        os.remove(last)
+        try:
+            # the run for the last file starts when the output reaches it
+            with self.assertRaises(Exception):
+                list(out["stdout"])
+        finally:
+            with open(last, "w") as f:
+                f.write(content)
+
     def tearDown(self) -> None:
         os.remove("file1.txt")
         os.remove("file2.txt")